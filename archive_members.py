@@ -0,0 +1,115 @@
+"""
+Project: ChemiDoc File Integrity Monitoring System
+Purpose: Hashes files stored inside zip/tar archives without extracting them
+A member is monitored under the path "<archive path>::<member name>".
+"""
+
+import hashlib
+import os
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+MEMBER_SEPARATOR = "::"
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+def member_path(archive_path, member_name):
+    return f"{archive_path}{MEMBER_SEPARATOR}{member_name}"
+
+
+def split_member_path(filepath):
+    #Returns (archive, member) for archive members, None for plain files
+    archive_path, sep, member_name = filepath.partition(MEMBER_SEPARATOR)
+    if not sep or not member_name or not is_archive(archive_path):
+        return None
+    return archive_path, member_name
+
+
+def is_archive(filepath):
+    return filepath.lower().endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(filepath)
+
+
+def _hash_stream(stream, algorithm):
+    hash_func = hashlib.new(algorithm)
+    size = 0
+    #8KB Chunks, same as plain files
+    while chunk := stream.read(8192):
+        hash_func.update(chunk)
+        size += len(chunk)
+    return hash_func.hexdigest(), size
+
+
+def iter_member_hashes(archive_path, file_extension = ".scn", algorithm = 'sha256', names = None):
+    #One sequential pass, so compressed tar files are only decompressed once.
+    #names, if given, picks the members to hash instead of file_extension
+    def wanted(name):
+        return name in names if names is not None else name.endswith(file_extension)
+
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not wanted(info.filename):
+                    continue
+                with zf.open(info) as stream:
+                    yield (info.filename, *_hash_stream(stream, algorithm))
+    else:
+        with tarfile.open(archive_path, "r:*") as tf:
+            for info in tf:
+                if not info.isfile() or not wanted(info.name):
+                    continue
+                yield (info.name, *_hash_stream(tf.extractfile(info), algorithm))
+
+
+def hash_member(archive_path, member_name, algorithm = 'sha256'):
+    #Returns (hash, size), or None if the member is not in the archive
+    try:
+        if zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path) as zf:
+                with zf.open(member_name) as stream:
+                    return _hash_stream(stream, algorithm)
+        with tarfile.open(archive_path, "r:*") as tf:
+            stream = tf.extractfile(member_name)
+            if stream is None:
+                return None
+            return _hash_stream(stream, algorithm)
+    except KeyError:
+        return None
+
+
+def member_exists(archive_path, member_name):
+    try:
+        if zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path) as zf:
+                zf.getinfo(member_name)
+                return True
+        with tarfile.open(archive_path, "r:*") as tf:
+            return tf.getmember(member_name).isfile()
+    except (KeyError, tarfile.TarError, zipfile.BadZipFile):
+        return False
+
+
+def list_archive_hashes(archive_path, file_extension = ".scn"):
+    #Worker for thread pools: (archive, [(member, hash, size)...], error)
+    try:
+        return archive_path, list(iter_member_hashes(archive_path, file_extension)), None
+    except Exception as e:
+        return archive_path, [], e
+
+
+def iter_archives_hashed(archive_paths, file_extension = ".scn", max_workers = 4):
+    #Yields list_archive_hashes results as they finish, with a bounded number in flight
+    archive_paths = iter(archive_paths)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = set()
+        while True:
+            for archive_path in archive_paths:
+                pending.add(pool.submit(list_archive_hashes, archive_path, file_extension))
+                if len(pending) >= max_workers * 2:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
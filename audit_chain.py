@@ -0,0 +1,581 @@
+"""
+Project: ChemiDoc File Integrity Monitoring System
+Purpose: Tamper-evident audit log for registrations and approved edits
+Each registration/edit/removal is appended to audit_log and linked to the
+previous entry by hash. The entry hashes are also leaves of an append-only
+Merkle tree (a Merkle mountain range), whose roots are exported to a
+checkpoint file that should be kept outside the database.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+
+GENESIS_HASH = "0" * 64
+
+
+#Canonical payloads - the same functions are used when logging and when auditing
+def _canonical(payload):
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"))
+
+
+def registration_payload(row):
+    filepath, filename, original_hash, file_size, created_date = row
+    return _canonical({
+        "filepath": filepath,
+        "filename": filename,
+        "original_hash": original_hash,
+        "file_size": file_size,
+        "created_date": created_date,
+    })
+
+
+def edit_payload(row):
+    (file_id, edit_date, edit_type, edit_description,
+     previous_hash, new_hash, approved_by, software_used) = row
+    return _canonical({
+        "file_id": file_id,
+        "edit_date": edit_date,
+        "edit_type": edit_type,
+        "edit_description": edit_description,
+        "previous_hash": previous_hash,
+        "new_hash": new_hash,
+        "approved_by": approved_by,
+        "software_used": software_used,
+    })
+
+
+def removal_payload(filepath, original_hash, removed_date):
+    return _canonical({
+        "filepath": filepath,
+        "original_hash": original_hash,
+        "removed_date": removed_date,
+    })
+
+
+def entry_hash(seq, prev_hash, event_type, payload):
+    data = f"{seq}|{prev_hash}|{event_type}|{payload}".encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+#Merkle tree helpers - leaves and inner nodes use different prefixes
+def leaf_hash(entry_hex):
+    return hashlib.sha256(b"\x00" + bytes.fromhex(entry_hex)).digest()
+
+
+def node_hash(left, right):
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def bag_peaks(peaks):
+    if not peaks:
+        return bytes(32)
+    root = peaks[-1]
+    for peak in reversed(peaks[:-1]):
+        root = node_hash(peak, root)
+    return root
+
+
+def push_leaf(peaks, leaf):
+    #peaks is a list of (height, hash), highest first
+    node, height = leaf, 0
+    while peaks and peaks[-1][0] == height:
+        _, left = peaks.pop()
+        node = node_hash(left, node)
+        height += 1
+    peaks.append((height, node))
+
+
+def verify_inclusion(proof, entry_hex, merkle_root):
+    node = leaf_hash(entry_hex)
+    for side, sibling in proof["path"]:
+        sibling = bytes.fromhex(sibling)
+        node = node_hash(sibling, node) if side == "L" else node_hash(node, sibling)
+
+    peaks = [bytes.fromhex(p) for p in proof["peaks"]]
+    peaks.insert(proof["peak_position"], node)
+    return bag_peaks(peaks).hex() == merkle_root
+
+
+def is_legacy_layout(cursor):
+    #Schema v1 (file_hash column) has to be migrated before it can be chained
+    cursor.execute('PRAGMA table_info(file_hashes)')
+    return "original_hash" not in [row[1] for row in cursor.fetchall()]
+
+
+def create_tables(cursor):
+    #Hash Chain Table - seq is also the Merkle leaf index
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS audit_log (
+            seq INTEGER PRIMARY KEY,
+            event_type TEXT NOT NULL,
+            source_id INTEGER NOT NULL,
+            file_id INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            prev_hash TEXT NOT NULL,
+            entry_hash TEXT NOT NULL,
+            logged_date TEXT NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_audit_log_source
+        ON audit_log (event_type, source_id)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_audit_log_file
+        ON audit_log (file_id, seq)
+    ''')
+
+    #Merkle Nodes - only complete subtrees are stored, they never change
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS audit_merkle (
+            level INTEGER NOT NULL,
+            idx INTEGER NOT NULL,
+            node_hash BLOB NOT NULL,
+            PRIMARY KEY (level, idx)
+        ) WITHOUT ROWID
+    ''')
+
+    #Checkpoints - also exported to the checkpoint file
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS audit_checkpoints (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tree_size INTEGER NOT NULL,
+            merkle_root TEXT NOT NULL,
+            chain_head TEXT NOT NULL,
+            created_date TEXT NOT NULL
+        )
+    ''')
+
+
+class AuditChain:
+    def __init__(self, db_path = "lab_image_integrity.db", checkpoint_file = None, checkpoint_interval = 1000,
+                 edit_archive = None):
+        self.db_path = db_path
+        #TieredStorage for edit rows moved out of the hot database; their payloads live there
+        if edit_archive is None:
+            from storage_tiers import TieredStorage
+            edit_archive = TieredStorage(db_path)
+        self.edit_archive = edit_archive
+        if checkpoint_file is None:
+            checkpoint_file = os.path.splitext(db_path)[0] + "_checkpoints.jsonl"
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_interval = checkpoint_interval
+        self.init_tables()
+
+    def init_tables(self):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        create_tables(cursor)
+        conn.commit()
+        conn.close()
+        self.checkpoint_if_due()
+
+    def seal_existing(self, cursor, batch_size = 5000):
+        #Run once by the schema migration that introduces the chain; rows
+        #without an entry after that are reported by verify_log()
+        if is_legacy_layout(cursor):
+            return 0
+        cursor.execute('''
+            SELECT created_date, 'register', id FROM file_hashes
+            WHERE id NOT IN (SELECT source_id FROM audit_log WHERE event_type = 'register')
+            UNION ALL
+            SELECT edit_date, 'edit', id FROM edit_history
+            WHERE id NOT IN (SELECT source_id FROM audit_log WHERE event_type = 'edit')
+            ORDER BY 1, 3
+        ''')
+        pending = cursor.fetchall()
+
+        for i, (_, event_type, source_id) in enumerate(pending, 1):
+            if event_type == "register":
+                self.log_registration(cursor, source_id)
+            else:
+                self.log_edit(cursor, source_id)
+            if i % batch_size == 0:
+                cursor.connection.commit()
+        cursor.connection.commit()
+        return len(pending)
+
+    #Appending - call inside the caller's transaction, after its own write
+    def log_registration(self, cursor, file_id):
+        cursor.execute('''
+            SELECT filepath, filename, original_hash, file_size, created_date
+            FROM file_hashes WHERE id = ?
+        ''', (file_id,))
+        payload = registration_payload(cursor.fetchone())
+        return self._append(cursor, "register", file_id, file_id, payload)
+
+    def log_edit(self, cursor, edit_id):
+        cursor.execute('''
+            SELECT file_id, edit_date, edit_type, edit_description,
+                   previous_hash, new_hash, approved_by, software_used
+            FROM edit_history WHERE id = ?
+        ''', (edit_id,))
+        row = cursor.fetchone()
+        return self._append(cursor, "edit", edit_id, row[0], edit_payload(row))
+
+    def log_removal(self, cursor, file_id, removed_date):
+        cursor.execute('SELECT filepath, original_hash FROM file_hashes WHERE id = ?', (file_id,))
+        filepath, original_hash = cursor.fetchone()
+        payload = removal_payload(filepath, original_hash, removed_date)
+        return self._append(cursor, "remove", file_id, file_id, payload)
+
+    def _append(self, cursor, event_type, source_id, file_id, payload):
+        cursor.execute('SELECT seq, entry_hash FROM audit_log ORDER BY seq DESC LIMIT 1')
+        last = cursor.fetchone()
+        seq, prev_hash = (last[0] + 1, last[1]) if last else (0, GENESIS_HASH)
+        new_hash = entry_hash(seq, prev_hash, event_type, payload)
+
+        cursor.execute('''
+            INSERT INTO audit_log
+            (seq, event_type, source_id, file_id, payload, prev_hash, entry_hash, logged_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (seq, event_type, source_id, file_id, payload, prev_hash, new_hash,
+              datetime.now().isoformat()))
+
+        #Add the leaf and any subtree it completes: O(log n) rows
+        node, level, idx = leaf_hash(new_hash), 0, seq
+        cursor.execute('INSERT INTO audit_merkle (level, idx, node_hash) VALUES (?, ?, ?)',
+                       (level, idx, node))
+        while idx % 2 == 1:
+            cursor.execute('SELECT node_hash FROM audit_merkle WHERE level = ? AND idx = ?',
+                           (level, idx - 1))
+            node = node_hash(cursor.fetchone()[0], node)
+            level, idx = level + 1, idx // 2
+            cursor.execute('INSERT INTO audit_merkle (level, idx, node_hash) VALUES (?, ?, ?)',
+                           (level, idx, node))
+        return seq
+
+    #Merkle roots and proofs
+    def _peaks(self, cursor, tree_size):
+        peaks = []
+        offset = 0
+        for height in range(tree_size.bit_length() - 1, -1, -1):
+            if tree_size & (1 << height):
+                cursor.execute('SELECT node_hash FROM audit_merkle WHERE level = ? AND idx = ?',
+                               (height, offset >> height))
+                peaks.append((height, offset, cursor.fetchone()[0]))
+                offset += 1 << height
+        return peaks
+
+    def merkle_root(self, cursor, tree_size):
+        return bag_peaks([peak for _, _, peak in self._peaks(cursor, tree_size)]).hex()
+
+    def inclusion_proof(self, cursor, seq, tree_size):
+        peaks = self._peaks(cursor, tree_size)
+        for position, (height, offset, _) in enumerate(peaks):
+            if offset <= seq < offset + (1 << height):
+                break
+
+        path = []
+        idx = seq
+        for level in range(height):
+            cursor.execute('SELECT node_hash FROM audit_merkle WHERE level = ? AND idx = ?',
+                           (level, idx ^ 1))
+            side = "L" if idx % 2 else "R"
+            path.append((side, cursor.fetchone()[0].hex()))
+            idx //= 2
+
+        return {
+            "leaf_index": seq,
+            "tree_size": tree_size,
+            "path": path,
+            "peaks": [p.hex() for i, (_, _, p) in enumerate(peaks) if i != position],
+            "peak_position": position,
+        }
+
+    #Checkpoints
+    def load_checkpoints(self):
+        if not os.path.exists(self.checkpoint_file):
+            return []
+        with open(self.checkpoint_file) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def create_checkpoint(self):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT seq, entry_hash FROM audit_log ORDER BY seq DESC LIMIT 1')
+            last = cursor.fetchone()
+            if not last:
+                return None
+
+            checkpoint = {
+                "tree_size": last[0] + 1,
+                "merkle_root": self.merkle_root(cursor, last[0] + 1),
+                "chain_head": last[1],
+                "created_date": datetime.now().isoformat(),
+            }
+            cursor.execute('''
+                INSERT INTO audit_checkpoints (tree_size, merkle_root, chain_head, created_date)
+                VALUES (?, ?, ?, ?)
+            ''', (checkpoint["tree_size"], checkpoint["merkle_root"],
+                  checkpoint["chain_head"], checkpoint["created_date"]))
+            conn.commit()
+        finally:
+            conn.close()
+
+        with open(self.checkpoint_file, "a") as f:
+            f.write(json.dumps(checkpoint) + "\n")
+        return checkpoint
+
+    def checkpoint_if_due(self):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        #seq is the primary key, so this is one index lookup instead of a count
+        cursor.execute('SELECT COALESCE(MAX(seq) + 1, 0) FROM audit_log')
+        tree_size = cursor.fetchone()[0]
+        cursor.execute('SELECT MAX(tree_size) FROM audit_checkpoints')
+        checkpointed = cursor.fetchone()[0] or 0
+        conn.close()
+
+        if tree_size - checkpointed >= self.checkpoint_interval:
+            return self.create_checkpoint()
+        return None
+
+    #Verification
+    def verify_log(self, full = False):
+        #Incremental mode only re-reads the source rows of entries added after the
+        #last checkpoint; older rows are covered by a full audit
+        checkpoints = self.load_checkpoints()
+        problems = []
+
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        if is_legacy_layout(cursor):
+            conn.close()
+            return {"status": "error", "message": "Legacy schema - migrate the database before auditing"}
+
+        #Start from the last trusted checkpoint unless a full audit is requested
+        if checkpoints and not full:
+            trusted = checkpoints[-1]
+            start = trusted["tree_size"]
+            prev_hash = trusted["chain_head"]
+            cursor.execute('SELECT entry_hash FROM audit_log WHERE seq = ?', (start - 1,))
+            head = cursor.fetchone()
+            if not head or head[0] != prev_hash:
+                problems.append(f"Chain head at checkpoint {start} does not match")
+            if self.merkle_root(cursor, start) != trusted["merkle_root"]:
+                problems.append(f"Merkle root at checkpoint {start} does not match")
+            peaks = [(h, p) for h, _, p in self._peaks(cursor, start)]
+        else:
+            start, prev_hash, peaks = 0, GENESIS_HASH, []
+
+        expected_roots = {c["tree_size"]: c["merkle_root"] for c in checkpoints if c["tree_size"] > start}
+
+        cursor.execute('''
+            SELECT a.seq, a.event_type, a.payload, a.prev_hash, a.entry_hash, a.file_id, a.source_id,
+                   f.filepath, f.filename, f.original_hash, f.file_size, f.created_date,
+                   e.file_id, e.edit_date, e.edit_type, e.edit_description,
+                   e.previous_hash, e.new_hash, e.approved_by, e.software_used
+            FROM audit_log a
+            LEFT JOIN file_hashes f ON a.event_type = 'register' AND f.id = a.source_id
+            LEFT JOIN edit_history e ON a.event_type = 'edit' AND e.id = a.source_id
+            WHERE a.seq >= ?
+            ORDER BY a.seq
+        ''', (start,))
+
+        removed = self._removed_file_ids(conn)
+        latest_hashes = {}
+        checked = 0
+        expected_seq = start
+        while rows := cursor.fetchmany(10000):
+            for row in rows:
+                seq, event_type, payload, stored_prev, stored_hash, file_id, source_id = row[:7]
+                payload = payload or self._archived_payload(event_type, source_id)
+                if seq != expected_seq:
+                    problems.append(f"Entry {expected_seq} is missing")
+                    expected_seq = seq
+                if stored_prev != prev_hash:
+                    problems.append(f"Entry {seq}: broken link to previous entry")
+                if entry_hash(seq, stored_prev, event_type, payload) != stored_hash:
+                    problems.append(f"Entry {seq}: entry hash does not match its contents")
+
+                problem = self._check_source(seq, event_type, payload, file_id, source_id,
+                                             row[7:12], row[12:], removed)
+                if problem:
+                    problems.append(problem)
+                self._track_hash(latest_hashes, event_type, file_id, payload)
+
+                push_leaf(peaks, leaf_hash(stored_hash))
+                prev_hash = stored_hash
+                expected_seq += 1
+                checked += 1
+
+                root = expected_roots.get(expected_seq)
+                if root and bag_peaks([p for _, p in peaks]).hex() != root:
+                    problems.append(f"Merkle root at checkpoint {expected_seq} does not match")
+
+        #The stored tree must agree with the one rebuilt from the entries
+        if checked and self.merkle_root(cursor, expected_seq) != bag_peaks([p for _, p in peaks]).hex():
+            problems.append("Stored Merkle tree does not match the audit log")
+
+        problems.extend(self._check_current_hashes(cursor, latest_hashes))
+        problems.extend(self._unsealed_rows(cursor))
+        conn.close()
+
+        result = self._result(problems, checked, start)
+        result["scope"] = "full" if start == 0 else "since_checkpoint"
+        if start:
+            result["note"] = (f"Source rows and current hashes of files last logged before entry {start} "
+                              "were not rechecked; run a full audit to cover them")
+        return result
+
+    def _track_hash(self, latest_hashes, event_type, file_id, payload):
+        #Last logged hash per file, to compare with file_hashes.current_hash
+        if not payload:
+            return
+        if event_type == "register":
+            latest_hashes[file_id] = json.loads(payload)["original_hash"]
+        elif event_type == "edit":
+            latest_hashes[file_id] = json.loads(payload)["new_hash"]
+        else:
+            latest_hashes.pop(file_id, None)
+
+    def _check_current_hashes(self, cursor, latest_hashes, batch_size = 500):
+        problems = []
+        file_ids = sorted(latest_hashes)
+        for i in range(0, len(file_ids), batch_size):
+            batch = file_ids[i:i + batch_size]
+            cursor.execute(f'''
+                SELECT id, filepath, current_hash FROM file_hashes
+                WHERE id IN ({", ".join("?" * len(batch))})
+            ''', batch)
+            for file_id, filepath, current_hash in cursor.fetchall():
+                if current_hash != latest_hashes[file_id]:
+                    problems.append(f"File {file_id}: current_hash does not match the last logged hash ({filepath})")
+        return problems
+
+    def _unsealed_rows(self, cursor):
+        #Every source row is chained when written; one without an entry was inserted behind the log's back
+        cursor.execute('''
+            SELECT 'file_hashes', id FROM file_hashes
+            WHERE id NOT IN (SELECT source_id FROM audit_log WHERE event_type = 'register')
+            UNION ALL
+            SELECT 'edit_history', id FROM edit_history
+            WHERE id NOT IN (SELECT source_id FROM audit_log WHERE event_type = 'edit')
+        ''')
+        return [f"{table} row {row_id} has no audit entry" for table, row_id in cursor.fetchall()]
+
+    def _removed_file_ids(self, conn):
+        return {r[0] for r in conn.execute("SELECT file_id FROM audit_log WHERE event_type = 'remove'")}
+
+    def _check_source(self, seq, event_type, payload, file_id, source_id, file_row, edit_row, removed):
+        if event_type == "register":
+            if file_row[0] is None:
+                if file_id not in removed:
+                    return f"Entry {seq}: registration row is missing"
+                return None
+            if registration_payload(file_row) != payload:
+                return f"Entry {seq}: file_hashes row was modified ({file_row[0]})"
+        elif event_type == "edit":
+            if edit_row[0] is None:
+                edit_row = self._archived_edit(source_id)
+            if edit_row is None:
+                return f"Entry {seq}: edit_history row is missing"
+            if edit_payload(edit_row) != payload:
+                return f"Entry {seq}: edit_history row was modified"
+        return None
+
+    def _archived_payload(self, event_type, source_id):
+        #Archiving empties the payload of edit entries; the archived row must rebuild it exactly
+        if event_type != "edit":
+            return ""
+        row = self._archived_edit(source_id)
+        return edit_payload(row) if row else ""
+
+    def _archived_edit(self, edit_id):
+        if self.edit_archive is None:
+            return None
+        row = self.edit_archive.find_edit(edit_id)
+        #Archived rows keep the id first; the payload starts at file_id
+        return row[1:] if row else None
+
+    def verify_file_history(self, filepath):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        if is_legacy_layout(cursor):
+            conn.close()
+            return {"status": "error", "message": "Legacy schema - migrate the database before auditing"}
+
+        cursor.execute('SELECT id, current_hash FROM file_hashes WHERE filepath = ?', (filepath,))
+        result = cursor.fetchone()
+        if not result:
+            conn.close()
+            return {"status": "unregistered", "message": "File not in database"}
+        file_id, current_hash = result
+
+        cursor.execute('''
+            SELECT seq, event_type, source_id, payload, prev_hash, entry_hash
+            FROM audit_log WHERE file_id = ? ORDER BY seq
+        ''', (file_id,))
+        entries = cursor.fetchall()
+
+        checkpoints = self.load_checkpoints()
+        trusted = checkpoints[-1] if checkpoints else None
+        problems = []
+        unproven = 0
+        latest_hash = None
+
+        for seq, event_type, source_id, payload, stored_prev, stored_hash in entries:
+            payload = payload or self._archived_payload(event_type, source_id)
+            if entry_hash(seq, stored_prev, event_type, payload) != stored_hash:
+                problems.append(f"Entry {seq}: entry hash does not match its contents")
+
+            if event_type == "register":
+                cursor.execute('''
+                    SELECT filepath, filename, original_hash, file_size, created_date
+                    FROM file_hashes WHERE id = ?
+                ''', (source_id,))
+                if registration_payload(cursor.fetchone()) != payload:
+                    problems.append(f"Entry {seq}: file_hashes row was modified")
+                latest_hash = json.loads(payload)["original_hash"]
+            elif event_type == "edit":
+                cursor.execute('''
+                    SELECT file_id, edit_date, edit_type, edit_description,
+                           previous_hash, new_hash, approved_by, software_used
+                    FROM edit_history WHERE id = ?
+                ''', (source_id,))
+                row = cursor.fetchone() or self._archived_edit(source_id)
+                if not row or edit_payload(row) != payload:
+                    problems.append(f"Entry {seq}: edit_history row was modified")
+                if payload:
+                    latest_hash = json.loads(payload)["new_hash"]
+
+            #O(log n) proof against the last exported checkpoint
+            if trusted and seq < trusted["tree_size"]:
+                proof = self.inclusion_proof(cursor, seq, trusted["tree_size"])
+                if not verify_inclusion(proof, stored_hash, trusted["merkle_root"]):
+                    problems.append(f"Entry {seq}: not included in checkpoint {trusted['tree_size']}")
+            else:
+                unproven += 1
+        conn.close()
+
+        if not entries:
+            problems.append("No audit entries for this file")
+        elif latest_hash != current_hash:
+            problems.append("current_hash does not match the last logged hash")
+
+        result = self._result(problems, len(entries), 0)
+        result["filepath"] = filepath
+        result["unproven_entries"] = unproven
+        return result
+
+    def _result(self, problems, checked, start):
+        if problems:
+            return {
+                "status": "tampered",
+                "message": " Warning: Audit log has been tampered with!!!",
+                "checked_entries": checked,
+                "start_entry": start,
+                "problems": problems,
+            }
+        return {
+            "status": "verified",
+            "message": "Audit log verified - No tampering detected",
+            "checked_entries": checked,
+            "start_entry": start,
+        }
@@ -11,7 +11,7 @@ def register_new_image():
     folder_path = input("Enter Folder Path Containing Images: ")
 
     print(f"\nRegistering all image files in folder: {folder_path}")
-    monitor.register_folder(folder_path, registered_by=researcher_name)
+    monitor.register_directory(folder_path, registered_by=researcher_name)
     print("\nRegistration Complete")
 
 #Approving Edits: Run After Making Legal Edits
@@ -57,9 +57,7 @@ def daily_verification():
     print("\nDaily Image Verification\n")
     folder_path = input("Enter Folder Path Containing Images for Verification: ")
 
-    results = monitor.verify_folder(folder_path)
-
-    for filepath, result in results.items():
+    for filepath, result in monitor.iter_verify_directory(folder_path):
         print(f"{filepath}: {result['message']}")
 
     print("\nVerification Complete.")
@@ -119,10 +117,10 @@ def lab_menu():
         elif choice == "4":
             check_file_status()
         elif choice == "5":
-            generate_weekly_report()
+            filepath = input("Enter File Path of Image: ")
+            monitor.print_edit_history(filepath)
         elif choice == "6":
-            print("Exiting the system.")
-            break
+            generate_weekly_report()
         elif choice == "7":
             print("Exiting the system.")
             break
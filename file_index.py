@@ -0,0 +1,339 @@
+"""
+Project: ChemiDoc File Integrity Monitoring System
+Purpose: Memory-compact, in-process index of the monitored files
+file_hashes is loaded into array-backed columns (raw 32-byte digests in
+packed byte buffers, integer epoch timestamps, interned paths) instead of
+tuples of hex/ISO strings. Lookups by path and by hash are O(1), refresh()
+only reads rows changed since the last load (schema v4 change_seq), and the
+index can be saved to a snapshot file that is mmap'ed for instant startup.
+"""
+
+import json
+import mmap
+import sqlite3
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+
+DIGEST_SIZE = 32
+SNAPSHOT_MAGIC = b"GELIDX01"
+REMOVED = 0
+
+
+def to_epoch(iso_date):
+    if not iso_date:
+        return 0
+    return int(datetime.fromisoformat(iso_date).timestamp())
+
+
+class FileRecord:
+    __slots__ = ("file_id", "filepath", "original_hash", "current_hash",
+                 "file_size", "created_epoch", "last_verified_epoch", "status")
+
+    def __init__(self, file_id, filepath, original_hash, current_hash,
+                 file_size, created_epoch, last_verified_epoch, status):
+        self.file_id = file_id
+        self.filepath = filepath
+        self.original_hash = original_hash
+        self.current_hash = current_hash
+        self.file_size = file_size
+        self.created_epoch = created_epoch
+        self.last_verified_epoch = last_verified_epoch
+        self.status = status
+
+    def __repr__(self):
+        return f"FileRecord({self.filepath!r}, status={self.status!r}, current_hash={self.current_hash[:16]}...)"
+
+
+class FileIndex:
+    def __init__(self, db_path = "lab_image_integrity.db"):
+        self.db_path = db_path
+        self._reset()
+
+    def _reset(self):
+        #One entry per row, in id order
+        self.ids = array('q')
+        self.sizes = array('q')
+        self.created = array('q')
+        self.verified = array('q')
+        self.status_codes = array('B')
+        self.original_digests = bytearray()
+        self.current_digests = bytearray()
+        self.paths = []
+
+        #Code 0 marks removed rows
+        self.status_names = ["<removed>"]
+        self._status_lookup = {}
+        self.change_seq = 0
+        self.removed_count = 0
+
+        #Built on first use so a snapshot load stays instant
+        self._by_path = None
+        self._by_hash = None
+        self._snapshot = None
+
+    #Loading
+    def load(self):
+        self._reset()
+        return self.refresh()
+
+    def refresh(self):
+        #Applies rows added/changed/removed since the last load; returns how many
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        try:
+            #One read transaction so the counter and the rows agree
+            cursor.execute('BEGIN')
+            cursor.execute('SELECT value FROM file_hashes_counter')
+            latest = cursor.fetchone()[0]
+
+            #Nothing changed: a snapshot stays mapped instead of being copied
+            if latest == self.change_seq and len(self.ids):
+                cursor.execute('COMMIT')
+                return 0
+            self._make_writable()
+
+            #Rows written before schema v4 have change_seq 0, so a first load starts below it
+            since = self.change_seq if len(self.ids) else -1
+            cursor.execute('''
+                SELECT id, filepath, original_hash, current_hash, file_size,
+                       created_date, last_verified, status
+                FROM file_hashes WHERE change_seq > ? ORDER BY id
+            ''', (since,))
+            changed = 0
+            while rows := cursor.fetchmany(10000):
+                for row in rows:
+                    self._apply_row(row)
+                    changed += 1
+
+            cursor.execute('SELECT file_id FROM file_hashes_removed WHERE change_seq > ?', (self.change_seq,))
+            for (file_id,) in cursor.fetchall():
+                if self._remove(file_id):
+                    changed += 1
+            cursor.execute('COMMIT')
+        finally:
+            conn.close()
+
+        self.change_seq = latest
+        return changed
+
+    def _status_code(self, status):
+        code = self._status_lookup.get(status)
+        if code is None:
+            code = len(self.status_names)
+            self.status_names.append(status)
+            self._status_lookup[status] = code
+        return code
+
+    def _row_of(self, file_id):
+        i = bisect_left(self.ids, file_id)
+        if i < len(self.ids) and self.ids[i] == file_id:
+            return i
+        return None
+
+    def _apply_row(self, row):
+        file_id, filepath, original_hash, current_hash, file_size, created_date, last_verified, status = row
+        current = bytes.fromhex(current_hash or original_hash)
+        i = self._row_of(file_id)
+
+        if i is None:
+            #New ids are always larger (AUTOINCREMENT), so appending keeps ids sorted
+            i = len(self.ids)
+            self.ids.append(file_id)
+            self.sizes.append(file_size)
+            self.created.append(to_epoch(created_date))
+            self.verified.append(to_epoch(last_verified))
+            self.status_codes.append(self._status_code(status))
+            self.original_digests += bytes.fromhex(original_hash)
+            self.current_digests += current
+            self.paths.append(sys.intern(filepath))
+        else:
+            self._unindex(i)
+            self.sizes[i] = file_size
+            self.verified[i] = to_epoch(last_verified)
+            self.status_codes[i] = self._status_code(status)
+            self.current_digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE] = current
+        self._index(i)
+
+    def _remove(self, file_id):
+        i = self._row_of(file_id)
+        if i is None or self.status_codes[i] == REMOVED:
+            return False
+        self._unindex(i)
+        self.status_codes[i] = REMOVED
+        self.removed_count += 1
+        return True
+
+    #Lookup dictionaries
+    def _index(self, i):
+        if self._by_path is not None:
+            self._by_path[self._path(i)] = i
+        if self._by_hash is not None:
+            self._by_hash.setdefault(self._current(i), []).append(i)
+
+    def _unindex(self, i):
+        if self._by_path is not None:
+            self._by_path.pop(self._path(i), None)
+        if self._by_hash is not None:
+            rows = self._by_hash.get(self._current(i), [])
+            if i in rows:
+                rows.remove(i)
+                if not rows:
+                    del self._by_hash[self._current(i)]
+
+    def _build_lookups(self):
+        self._by_path = {}
+        self._by_hash = {}
+        for i in range(len(self.ids)):
+            if self.status_codes[i] != REMOVED:
+                self._index(i)
+
+    def _path(self, i):
+        if self.paths is None:
+            self._decode_paths()
+        return self.paths[i]
+
+    def _current(self, i):
+        return bytes(self.current_digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE])
+
+    def record(self, i):
+        return FileRecord(
+            self.ids[i],
+            self._path(i),
+            self.original_digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE].hex(),
+            self.current_digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE].hex(),
+            self.sizes[i],
+            self.created[i],
+            self.verified[i],
+            self.status_names[self.status_codes[i]],
+        )
+
+    def get(self, filepath):
+        if self._by_path is None:
+            self._build_lookups()
+        i = self._by_path.get(filepath)
+        return self.record(i) if i is not None else None
+
+    def find_by_hash(self, file_hash):
+        #Accepts a hex string or raw digest; returns every file currently at that hash
+        if self._by_hash is None:
+            self._build_lookups()
+        digest = bytes.fromhex(file_hash) if isinstance(file_hash, str) else bytes(file_hash)
+        return [self.record(i) for i in self._by_hash.get(digest, [])]
+
+    def duplicates(self):
+        if self._by_hash is None:
+            self._build_lookups()
+        for rows in self._by_hash.values():
+            if len(rows) > 1:
+                yield [self._path(i) for i in rows]
+
+    def __len__(self):
+        return len(self.ids) - self.removed_count
+
+    def __iter__(self):
+        for i in range(len(self.ids)):
+            if self.status_codes[i] != REMOVED:
+                yield self.record(i)
+
+    #Snapshots: JSON header, then the raw columns, all 8-byte aligned
+    def save_snapshot(self, snapshot_path):
+        keep = [i for i in range(len(self.ids)) if self.status_codes[i] != REMOVED]
+        paths = [self._path(i).encode("utf-8") for i in keep]
+        path_offsets = array('q', [0])
+        for p in paths:
+            path_offsets.append(path_offsets[-1] + len(p))
+
+        sections = [
+            ("ids", array('q', (self.ids[i] for i in keep)).tobytes()),
+            ("sizes", array('q', (self.sizes[i] for i in keep)).tobytes()),
+            ("created", array('q', (self.created[i] for i in keep)).tobytes()),
+            ("verified", array('q', (self.verified[i] for i in keep)).tobytes()),
+            ("status_codes", array('B', (self.status_codes[i] for i in keep)).tobytes()),
+            ("original_digests", b"".join(self.original_digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE] for i in keep)),
+            ("current_digests", b"".join(self.current_digests[i * DIGEST_SIZE:(i + 1) * DIGEST_SIZE] for i in keep)),
+            ("path_offsets", path_offsets.tobytes()),
+            ("path_blob", b"".join(paths)),
+        ]
+
+        layout = {}
+        offset = 0
+        for name, data in sections:
+            layout[name] = [offset, len(data)]
+            offset += len(data) + (-len(data) % 8)
+
+        header = json.dumps({
+            "count": len(keep),
+            "change_seq": self.change_seq,
+            "status_names": self.status_names,
+            "sections": layout,
+        }).encode("utf-8")
+        header += b" " * (-(len(header) + 12) % 8)
+
+        with open(snapshot_path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC + struct.pack("<I", len(header)) + header)
+            for _, data in sections:
+                f.write(data + b"\0" * (-len(data) % 8))
+        print(f"Index snapshot saved: {snapshot_path} ({len(keep)} files)")
+
+    @classmethod
+    def from_snapshot(cls, snapshot_path, db_path = "lab_image_integrity.db"):
+        #Columns are zero-copy views of the mapped file until the first refresh()
+        index = cls(db_path)
+        with open(snapshot_path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if mapped[:8] != SNAPSHOT_MAGIC:
+            mapped.close()
+            print(f"Error: Not an index snapshot - {snapshot_path}")
+            return None
+        header_size = struct.unpack("<I", mapped[8:12])[0]
+        header = json.loads(mapped[12:12 + header_size])
+        base = 12 + header_size
+        view = memoryview(mapped)
+
+        def section(name, fmt = None):
+            start, length = header["sections"][name]
+            data = view[base + start:base + start + length]
+            return data.cast(fmt) if fmt else data
+
+        index.ids = section("ids", 'q')
+        index.sizes = section("sizes", 'q')
+        index.created = section("created", 'q')
+        index.verified = section("verified", 'q')
+        index.status_codes = section("status_codes", 'B')
+        index.original_digests = section("original_digests")
+        index.current_digests = section("current_digests")
+        index._path_offsets = section("path_offsets", 'q')
+        index._path_blob = section("path_blob")
+        index.paths = None
+
+        index.status_names = header["status_names"]
+        index._status_lookup = {name: code for code, name in enumerate(index.status_names) if code}
+        index.change_seq = header["change_seq"]
+        index._snapshot = mapped
+        return index
+
+    def _decode_paths(self):
+        offsets, blob = self._path_offsets, self._path_blob
+        self.paths = [sys.intern(bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8"))
+                      for i in range(len(offsets) - 1)]
+
+    def _make_writable(self):
+        #Copies mmap'ed columns into growable arrays before they are modified
+        if self._snapshot is None:
+            return
+        if self.paths is None:
+            self._decode_paths()
+        self.ids = array('q', self.ids)
+        self.sizes = array('q', self.sizes)
+        self.created = array('q', self.created)
+        self.verified = array('q', self.verified)
+        self.status_codes = array('B', self.status_codes)
+        self.original_digests = bytearray(self.original_digests)
+        self.current_digests = bytearray(self.current_digests)
+        del self._path_offsets, self._path_blob
+        self._snapshot = None
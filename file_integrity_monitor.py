@@ -1,59 +1,45 @@
 """
 Project: ChemiDoc File Integrity Monitoring System
 Purpose: Verifies the integrity of ChemiDoc Imaging Files
-<<<<<<< HEAD
-=======
 Purpose 2: Tracks Legal vs Illegal Edits
->>>>>>> master
 Author: Geovany Serrano 
 """
 
 import hashlib
 import sqlite3 
 import os
-<<<<<<< HEAD
-from datetime import datetime
-from pathlib import Path
-import json
-
-
-class FileIntegrityMonitor:
-    def __init__(self, db_path = "file_integrity.db"):
-=======
 import json
 from datetime import datetime
 from pathlib import Path
 
+from audit_chain import AuditChain
+from schema_migrations import migrate_database
+from file_index import FileIndex
+from storage_tiers import TieredStorage
+from archive_members import (is_archive, split_member_path, member_path,
+                             hash_member, member_exists, iter_archives_hashed)
+
 
 class FileIntegrityMonitor:
     def __init__(self, db_path = "lab_image_integrity.db"):
->>>>>>> master
         self.db_path = db_path
         self.init_database()
+        self.tiers = TieredStorage(db_path)
+        self.audit_chain = AuditChain(db_path, edit_archive=self.tiers)
         
     def init_database(self):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
 
-<<<<<<< HEAD
-=======
+        #Only takes effect on a new database; archiving converts older ones
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+
         #Main Table
->>>>>>> master
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS file_hashes (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 filename TEXT NOT NULL,
                 filepath TEXT UNIQUE NOT NULL,
-<<<<<<< HEAD
-                file_hash TEXT NOT NULL,
-                file_size INTEGER NOT NULL,
-                created_date TEXT NOT NULL,
-                last_verified TEXT,
-                status TEXT DEFAULT 'Original'
-            )
-        ''')
-                       
-=======
                 original_hash TEXT NOT NULL,
                 current_hash TEXT NOT NULL,
                 file_size INTEGER NOT NULL,
@@ -81,18 +67,33 @@ class FileIntegrityMonitor:
             )
         ''')
 
->>>>>>> master
         conn.commit()
         conn.close()
+
+        #Upgrades older layouts in place (legacy file_hash column, missing indexes)
+        migrate_database(self.db_path)
         print(f"Database initialized: {self.db_path}")
 
+    def file_exists(self, filepath):
+        member = split_member_path(filepath)
+        if member:
+            return member_exists(*member)
+        return os.path.exists(filepath)
+
     def calculate_hash(self, filepath, algorithm = 'sha256'):
+        #Archive members are streamed straight from the archive
+        member = split_member_path(filepath)
+        if member:
+            try:
+                result = hash_member(*member, algorithm=algorithm)
+            except Exception as e:
+                print(f"Error: Calculating hash for {filepath}: {e}")
+                return None
+            return result[0] if result else None
+
         hash_func = hashlib.new(algorithm)
 
-<<<<<<< HEAD
-=======
         #this part converts the scn into bytes
->>>>>>> master
         try:
             with open(filepath, 'rb') as f:
                 #8KB Chunks
@@ -104,20 +105,38 @@ class FileIntegrityMonitor:
             print(f"Error: Calculating hash for {filepath}: {e}")
             return None
         
-<<<<<<< HEAD
-    def register_file(self, filepath):
-=======
-    def register_file(self, filepath, registered_by = "Lab Technician"):
->>>>>>> master
-        if not os.path.exists(filepath):
-            print(f"Error: File not found - {filepath}")
-            return False
+    #Returns (hash, size) reading the data once, or None
+    def hash_with_size(self, filepath):
+        member = split_member_path(filepath)
+        if member:
+            try:
+                return hash_member(*member)
+            except Exception as e:
+                print(f"Error: Calculating hash for {filepath}: {e}")
+                return None
 
         file_hash = self.calculate_hash(filepath)
         if not file_hash:
-            return False
+            return None
+        return file_hash, os.path.getsize(filepath)
+
+    def register_file(self, filepath, registered_by = "Lab Technician"):
+        return self.register_file_status(filepath, registered_by) == "registered"
+
+    #Returns "registered", "already_registered" or "error"
+    def register_file_status(self, filepath, registered_by = "Lab Technician"):
+        if not self.file_exists(filepath):
+            print(f"Error: File not found - {filepath}")
+            return "error"
 
-        file_size = os.path.getsize(filepath)
+        result = self.hash_with_size(filepath)
+        if not result:
+            return "error"
+
+        return self.register_hashed(filepath, *result, registered_by)
+
+    #Registers a file whose hash was already computed (e.g. while streaming an archive)
+    def register_hashed(self, filepath, file_hash, file_size, registered_by = "Lab Technician"):
         filename = os.path.basename(filepath)
         created_date = datetime.now().isoformat()
 
@@ -126,90 +145,58 @@ class FileIntegrityMonitor:
 
         try:
             cursor.execute('''
-<<<<<<< HEAD
-                INSERT INTO file_hashes (filename, filepath, file_hash, file_size, created_date)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (filename, filepath, file_hash, file_size, created_date))
-
-            conn.commit()
-            print(f" Registered: {filename}")
-            print(f" Hash: {file_hash[:16]}...")
-=======
                 INSERT INTO file_hashes 
                 (filename, filepath, original_hash, current_hash, file_size, created_date, status, notes)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (filename, filepath, file_hash, file_hash, file_size, created_date,
                   'Original', f'Registered by {registered_by}'))
+            self.audit_chain.log_registration(cursor, cursor.lastrowid)
 
             conn.commit()
+            self.audit_chain.checkpoint_if_due()
 
             print(f" Registered: {filename}")
             print(f" Original Hash: {file_hash[:16]}...")
             print(f" Status: Original \n")
->>>>>>> master
-            return True
+            return "registered"
 
         except sqlite3.IntegrityError:
             print(f"File already registered: {filename}")
-            return False
+            return "already_registered"
         except Exception as e:
             print(f"Error: registering file: {e}")
-            return False
+            return "error"
         finally:
             conn.close()
     
     def verify_file(self, filepath):
-        if not os.path.exists(filepath):
+        if not self.file_exists(filepath):
             return {"status": "error", "message": "File not found"}
         
-        current_hash = self.calculate_hash(filepath)
-        if not current_hash:
+        result = self.hash_with_size(filepath)
+        if not result:
             return {"status": "error", "message": "Calculating hash failed"}
-        
+
+        return self.verify_hashed(filepath, *result)
+
+    #Compares an already computed hash against the database
+    def verify_hashed(self, filepath, current_hash, current_size):
         #Get stored hash from database
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
 
-<<<<<<< HEAD
-        cursor.execute('SELECT file_hash, file_size, filename FROM file_hashes WHERE filepath = ?', (filepath,))
-=======
         cursor.execute('''
             SELECT id,
-            filename, original_hash, current_hash, file_size, status 
+            filename, original_hash, COALESCE(current_hash, original_hash), file_size, status 
             FROM file_hashes WHERE filepath = ? 
             ''', (filepath,))
->>>>>>> master
         result = cursor.fetchone()
 
         if not result:
             conn.close()
             return {"status": "unregistered", "message": "File not in database"}
          
-<<<<<<< HEAD
-        stored_hash, stored_size, filename = result 
-        current_size = os.path.getsize(filepath)
-
-        cursor.execute('''
-            UPDATE file_hashes 
-            SET last_verified = ?, status = ?
-            WHERE filepath = ?
-        ''', (datetime.now().isoformat(), 
-            'Original' if current_hash == stored_hash else 'TAMPERED', 
-            filepath))
-        
-        conn.commit()
-        conn.close()
-
-        if current_hash == stored_hash and current_size == stored_size:
-            return {
-                "status": "verified",
-                "filename": filename,
-                "message": "File integrity verified - No tampering detected"
-            }
-        else:
-=======
         file_id, filename, original_hash, stored_current_hash, stored_size, status = result 
-        current_size = os.path.getsize(filepath)
 
         #Update when last verified
         cursor.execute('''
@@ -239,7 +226,8 @@ class FileIntegrityMonitor:
             WHERE file_id = ? AND new_hash = ?
             ''', (file_id, current_hash))
 
-        is_approved_edit = cursor.fetchone()[0] > 0
+        #Older approvals may have been moved to the yearly archives
+        is_approved_edit = cursor.fetchone()[0] > 0 or self.tiers.is_archived_edit(file_id, current_hash)
 
         if is_approved_edit:
             conn.close()
@@ -252,23 +240,11 @@ class FileIntegrityMonitor:
 
         else:
             conn.close()
->>>>>>> master
             return {
                 "status": "tampered",
                 "filename": filename,
                 "message": " Warning: File has been tampered with!!!",
                 "details": {
-<<<<<<< HEAD
-                    "hash_match": current_hash == stored_hash,
-                    "size_match": current_size == stored_size,
-                    "stored_hash": stored_hash[:16] + "...",
-                    "current_hash": current_hash[:16] + "...",
-                    "stored_size": stored_size,
-                    "current_size": current_size, 
-                }
-            }
-        
-=======
                     "hash_match": original_hash[:16] + "...",
                     "expected_hash": stored_current_hash[:16] + "...",
                     "current_hash": current_hash[:16] + "...",
@@ -280,7 +256,7 @@ class FileIntegrityMonitor:
         
     #New Function for approving
     def approve_edit(self, filepath, edit_type, edit_description, approved_by, software_used = "Image Lab"):
-        if not os.path.exists(filepath):
+        if not self.file_exists(filepath):
             print(f"Error: File not found - {filepath}")
             return False
 
@@ -293,7 +269,7 @@ class FileIntegrityMonitor:
 
         try:
             cursor.execute('''
-                SELECT id, current_hash, status FROM file_hashes WHERE filepath = ?
+                SELECT id, COALESCE(current_hash, original_hash), status FROM file_hashes WHERE filepath = ?
             ''', (filepath,))
             result = cursor.fetchone()
 
@@ -313,6 +289,7 @@ class FileIntegrityMonitor:
                 (file_id, edit_date, edit_type, edit_description, previous_hash, new_hash, approved_by, software_used)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (file_id, edit_date, edit_type, edit_description, previous_hash, new_hash, approved_by, software_used))
+            self.audit_chain.log_edit(cursor, cursor.lastrowid)
                            
             #Updating current hash ans status to the main table
             cursor.execute('''
@@ -325,6 +302,7 @@ class FileIntegrityMonitor:
             ''', (new_hash, edit_date, f'Last edit: {edit_type} approved by {approved_by}', file_id))
 
             conn.commit()
+            self.audit_chain.checkpoint_if_due()
             print(f"Edit approved for: {os.path.basename(filepath)}\n")
             print(f"Edit tyep: {edit_type}\n") 
             print(f"Description: {edit_description}\n")
@@ -354,19 +332,38 @@ class FileIntegrityMonitor:
             conn.close()
             return []
 
-        file_id = result[0]
+        history = self.all_edits(cursor, result[0])
+        conn.close()
+
+        history.reverse()
+        return history
+
+    #Approved edits from the hot database and the yearly archives, oldest first
+    def all_edits(self, cursor, file_id, archived = None):
+        #archived: archived edit rows already grouped by file_id, when many files are listed
         cursor.execute('''
             SELECT edit_date, edit_type, edit_description, approved_by, software_used
             FROM edit_history 
             WHERE file_id = ? 
-            ORDER BY edit_date DESC
         ''', (file_id,))
+        edits = cursor.fetchall()
 
-        history = cursor.fetchall()
-        conn.close()
+        for (_, _, edit_date, edit_type, edit_description,
+             _, _, approved_by, software_used) in (self.tiers.archived_edits(file_id) if archived is None
+                                                  else archived.get(file_id, [])):
+            edits.append((edit_date, edit_type, edit_description, approved_by, software_used))
 
-        return history
+        edits.sort(key=lambda edit: edit[0])
+        return edits
     
+    def is_registered(self, filepath):
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM file_hashes WHERE filepath = ?', (filepath,))
+        result = cursor.fetchone()
+        conn.close()
+        return result is not None
+
     #Another New Function 
     def print_edit_history(self, filepath):
         history = self.get_edit_history(filepath)
@@ -388,126 +385,173 @@ class FileIntegrityMonitor:
             print(f"Software Used: {software_used}")
             print("-" * 50)
 
->>>>>>> master
-    def register_directory(self, directory, file_extension = ".scn"):
+    def register_directory(self, directory, file_extension = ".scn", registered_by = "Lab Technician"):
         if not os.path.isdir(directory):
             print(f"Error: Directory not found - {directory}")
-            return 
+            return 0
         
         print(f"\nScanning directory: {directory}")
         print(f"Looking for files with extension: {file_extension}\n")
 
-        registered_count = 0
+        registered_count = sum(status == "registered" for _, status
+                               in self.iter_register_directory(directory, file_extension, registered_by))
+
+        print(f"\n{registered_count} files(s) registered successfully")
+        return registered_count
+
+    #Generator API - yields (filepath, status) as soon as each file is done,
+    #status as returned by register_file_status()
+    def iter_register_directory(self, directory, file_extension = ".scn", registered_by = "Lab Technician"):
+        if not os.path.isdir(directory):
+            yield directory, "error"
+            return
+
+        archives = []
         for root, dirs, files in os.walk(directory):
             for file in files:
+                filepath = os.path.join(root, file)
                 if file.endswith(file_extension):
-                    filepath = os.path.join(root, file)
-                    if self.register_file(filepath):
-                        registered_count += 1
+                    yield filepath, self.register_file_status(filepath, registered_by)
+                elif is_archive(filepath):
+                    archives.append(filepath)
+
+        yield from self.iter_register_archives(archives, registered_by, file_extension)
+
+    #Archives are hashed in parallel, database writes stay on this thread
+    def iter_register_archives(self, archive_paths, registered_by = "Lab Technician",
+                               file_extension = ".scn", max_workers = 4):
+        for archive_path, members, error in iter_archives_hashed(archive_paths, file_extension, max_workers):
+            if error:
+                print(f"Error: Reading archive {archive_path}: {error}")
+                yield archive_path, "error"
+                continue
+            for member_name, file_hash, file_size in members:
+                filepath = member_path(archive_path, member_name)
+                yield filepath, self.register_hashed(filepath, file_hash, file_size, registered_by)
+
+    def register_archives(self, archive_paths, registered_by = "Lab Technician",
+                          file_extension = ".scn", max_workers = 4):
+        return sum(status == "registered" for _, status
+                   in self.iter_register_archives(archive_paths, registered_by, file_extension, max_workers))
+
+    def register_archive(self, archive_path, registered_by = "Lab Technician", file_extension = ".scn"):
+        if not is_archive(archive_path):
+            print(f"Error: Archive not found - {archive_path}")
+            return 0
+        return self.register_archives([archive_path], registered_by, file_extension)
+
+    def iter_verify_archives(self, archive_paths, file_extension = ".scn", max_workers = 4):
+        for archive_path, members, error in iter_archives_hashed(archive_paths, file_extension, max_workers):
+            if error:
+                yield archive_path, {"status": "error", "message": f"Reading archive failed: {error}"}
+                continue
+            seen = set()
+            for member_name, file_hash, file_size in members:
+                filepath = member_path(archive_path, member_name)
+                seen.add(filepath)
+                yield filepath, self.verify_hashed(filepath, file_hash, file_size)
+
+            #Registered members that are no longer in the archive
+            for filepath in self.registered_members(archive_path, file_extension):
+                if filepath not in seen:
+                    yield filepath, {"status": "error", "message": "File not found"}
+
+    def registered_members(self, archive_path, file_extension = ".scn"):
+        #Range scan on the filepath index: every "<archive>::..." path sorts between these bounds
+        low = member_path(archive_path, "")
+        high = low[:-1] + chr(ord(low[-1]) + 1)
+        conn = sqlite3.connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT filepath FROM file_hashes WHERE filepath > ? AND filepath < ? ORDER BY filepath
+        ''', (low, high))
+        paths = [row[0] for row in cursor.fetchall() if row[0].endswith(file_extension)]
+        conn.close()
+        return paths
 
-        print(f"\n{registered_count} files(s) registered successfully")
-        
-        
-<<<<<<< HEAD
-        
-=======
->>>>>>> master
-    def verify_directory(self, directory, file_extension = ".scn"):
+    def verify_archives(self, archive_paths, file_extension = ".scn", max_workers = 4):
+        return dict(self.iter_verify_archives(archive_paths, file_extension, max_workers))
+
+    def verify_archive(self, archive_path, file_extension = ".scn"):
+        if not is_archive(archive_path):
+            return {archive_path: {"status": "error", "message": "File not found"}}
+        return self.verify_archives([archive_path], file_extension)
+
+    #Generator API - yields (filepath, result) as soon as each file is verified
+    def iter_verify_directory(self, directory, file_extension = ".scn"):
         if not os.path.isdir(directory):
-            print(f"Error: Directory not found - {directory}")
+            yield directory, {"status": "error", "message": "Directory not found"}
             return
-        
-        print(f"\nVerifying files in: {directory}")
-        
-        verified_count = 0
-<<<<<<< HEAD
-        tampered_count = 0
-=======
-        approved_edit_count = 0
-        unauthorized_count = 0
->>>>>>> master
 
+        archives = []
         for root, dirs, files in os.walk(directory):
             for file in files:
+                filepath = os.path.join(root, file)
                 if file.endswith(file_extension):
-                    filepath = os.path.join(root, file)
-                    result = self.verify_file(filepath)
-
-                    if result["status"] == "verified":
-<<<<<<< HEAD
-                        print(f" {file}: CLEAN")
-                        verified_count += 1
-                    elif result["status"] == "tampered":
-                        print(f" {file}: TAMPERED")
-                        tampered_count += 1
-                    elif result["status"] == "unregistered":
-                        print(f" {file}: NOT REGISTERED")
+                    yield filepath, self.verify_file(filepath)
+                elif is_archive(filepath):
+                    archives.append(filepath)
 
-        print(f"\n ---Verification Summary---")
-        print(f"Clean Files: {verified_count}")
-        print(f"Tampered Files: {tampered_count}")
-=======
-                        print(f" {file}: CLEAN ({result['file_status']})")
-                        verified_count += 1
-                    elif result["status"] == "approved_modifications":
-                        print(f" {file}: Approved Edit")
-                        approved_edit_count += 1
-                    elif result["status"] == "unauthorized_change":
-                        print(f" {file}: Unauthorized Change Detected!")
-                        unauthorized_count += 1
-                    elif result["status"] == "unregistered":
-                        print(f" {file}: Unregistered File")
+        yield from self.iter_verify_archives(archives, file_extension)
+
+    def verify_directory(self, directory, file_extension = ".scn"):
+        if not os.path.isdir(directory):
+            print(f"Error: Directory not found - {directory}")
+            return
+        
+        print(f"\nVerifying files in: {directory}")
+
+        summary = {"verified": 0, "approved_modifications": 0, "tampered": 0, "unregistered": 0, "error": 0}
+
+        for filepath, result in self.iter_verify_directory(directory, file_extension):
+            file = os.path.relpath(filepath, directory)
+            summary[result["status"]] += 1
+            if result["status"] == "verified":
+                print(f" {file}: CLEAN ({result['file_status']})")
+            elif result["status"] == "approved_modifications":
+                print(f" {file}: Approved Edit")
+            elif result["status"] == "tampered":
+                print(f" {file}: Unauthorized Change Detected!")
+            elif result["status"] == "unregistered":
+                print(f" {file}: Unregistered File")
+            else:
+                print(f" {file}: Error - {result['message']}")
 
         print(f"\n ---Verification Summary---")
-        print(f"Clean Files: {verified_count}")
-        print(f"Approved Edits: {approved_edit_count}")
-        print(f"Unauthorized Changes: {unauthorized_count}")
->>>>>>> master
+        print(f"Clean Files: {summary['verified']}")
+        print(f"Approved Edits: {summary['approved_modifications']}")
+        print(f"Unauthorized Changes: {summary['tampered']}")
+        return summary
 
     def generate_report(self, output_file = "integrity_report.txt"):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
 
-<<<<<<< HEAD
-        cursor.execute('SELECT * FROM file_hashes ORDER BY created_date DESC')
-        results = cursor.fetchall()
-        conn.close()
-
-        with open(output_file, 'w') as f:
-            f.write("=" * 70 + "\n")
-            f.write("FILE INTEGRITY MONITORING REPORT \n")
-            f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} \n")
-            f.write("=" * 70 + "\n\n")
-=======
+        #Explicit columns: migrated databases do not share the same column order
         cursor.execute('''
-            SELECT f.*,
-                    (SELECT COUNT(*) FROM edit_history e WHERE e.file_id = id) AS edit_count
-            FROM file_hashes f
-            ORDER BY f.created_date DESC
+            SELECT id, filename, filepath, original_hash, current_hash, file_size,
+                   created_date, last_verified, last_modified, status, notes
+            FROM file_hashes
+            ORDER BY created_date DESC
                        ''')
         results = cursor.fetchall()
 
+        #Archived edits are read once, block by block, instead of once per file
+        archived = {}
+        for edit in self.tiers.iter_archived_edits():
+            archived.setdefault(edit[1], []).append(edit)
+
         with open(output_file, 'w') as f:
             f.write("-" * 70 + "\n")
             f.write("FILE INTEGRITY MONITORING REPORT \n")
             f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} \n")
             f.write("-" * 70 + "\n\n")
->>>>>>> master
 
             for row in results:
+                edits = self.all_edits(cursor, row[0], archived)
+
                 f.write(f"Filename: {row[1]}\n")
                 f.write(f"Path: {row[2]}\n")
-<<<<<<< HEAD
-                f.write(f"Hash: {row[3]}\n")
-                f.write(f"size: {row[4]} bytes\n")
-                f.write(f"Registered: {row[5]}\n")
-                f.write(f"Last Verified: {row[6] or 'Never'}\n")
-                f.write(f"Status: {row[7]}\n")
-                f.write("-" * 70 + "\n\n")
-
-        print(f"Report Generated: {output_file}")
-
-=======
                 f.write(f"Original Hash: {row[3]}\n")
                 f.write(f"Current Hash: {row[4]} bytes\n")
                 f.write(f"Size: {row[5]} bytes\n")
@@ -516,19 +560,12 @@ class FileIntegrityMonitor:
                 f.write(f"Last Modified: {row[8] or 'Never'}\n")
                 f.write(f"Status: {row[9]}\n")
                 f.write(f"Notes: {row[10] or 'None'}\n")
-                f.write(f"Total Approved Edits: {row[11]}\n")
+                f.write(f"Total Approved Edits: {len(edits)}\n")
                 f.write("-" * 70 + "\n\n")
 
-                cursor.execute('''
-                    SELECT edit_date, edit_type, edit_description, approved_by
-                    FROM edit_history WHERE file_id = ?
-                    ORDER BY edit_date ASC
-                ''', (row[0],))
-                edits = cursor.fetchall()
-
                 if edits:
                     f.write("\nEdit History:\n")
-                    for i, (date, etype, desc, approver) in enumerate(edits, start=1):
+                    for i, (date, etype, desc, approver, _) in enumerate(edits, start=1):
                         f.write(f"{i}. {date} - {etype}\n")
                         f.write(f"Description: {desc}\n")
                         f.write(f"Approved by: {approver}\n")
@@ -542,12 +579,39 @@ class FileIntegrityMonitor:
     def remove_file(self, filepath):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
+        cursor.execute('SELECT id FROM file_hashes WHERE filepath = ?', (filepath,))
+        result = cursor.fetchone()
+        if result:
+            #Removal is logged so the audit does not flag the missing row
+            self.audit_chain.log_removal(cursor, result[0], datetime.now().isoformat())
         cursor.execute('DELETE FROM file_hashes WHERE filepath = ?', (filepath,))
         conn.commit()
         conn.close()
         print(f"File removed from monitoring: {filepath}")
 
->>>>>>> master
+    #Moves old edit/verification records out of the hot database
+    def archive_old_records(self, retention_days = 365):
+        return self.tiers.archive_old_records(retention_days)
+
+    #Compact in-memory view of file_hashes for reports, duplicate checks, etc.
+    def load_index(self, snapshot_path = None):
+        index = None
+        if snapshot_path and os.path.exists(snapshot_path):
+            index = FileIndex.from_snapshot(snapshot_path, self.db_path)
+        if index:
+            index.refresh()
+        else:
+            index = FileIndex(self.db_path)
+            index.load()
+        return index
+
+    #Audit log checks - incremental from the last checkpoint unless full=True
+    def verify_audit_log(self, full = False):
+        return self.audit_chain.verify_log(full=full)
+
+    def verify_file_history(self, filepath):
+        return self.audit_chain.verify_file_history(filepath)
+
 #if __name__ == "__main__":
 #    print("ChemiDoc File Integrity Monitoring System")
 #    print("=========================================\n")
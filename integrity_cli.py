@@ -0,0 +1,251 @@
+"""
+Project: ChemiDoc File Integrity Monitoring System
+Purpose: Non-interactive command line for cron jobs and pipelines
+Every result is written to stdout as one JSON object per line (JSON Lines)
+as soon as it is ready; progress messages go to stderr.
+
+Exit codes: 0 = all clean, 1 = tampering detected,
+            2 = usage error (argparse), 3 = errors or unregistered files
+"""
+
+import argparse
+import json
+import os
+import sys
+from contextlib import redirect_stdout
+
+from file_integrity_monitor import FileIntegrityMonitor
+from archive_members import is_archive
+from verification_queue import VerificationCoordinator, VerificationWorker, run_workers
+
+
+EXIT_OK = 0
+EXIT_TAMPERED = 1
+EXIT_ERROR = 3
+
+
+def emit(out, record):
+    out.write(json.dumps(record) + "\n")
+    out.flush()
+
+
+#Streams results for every path given: files, archive members, archives or directories.
+#Archive arguments are collected and hashed together, in parallel, after the other paths
+def iter_register(monitor, paths, registered_by, file_extension):
+    archives = []
+    for path in paths:
+        if os.path.isdir(path):
+            yield from monitor.iter_register_directory(path, file_extension, registered_by)
+        elif is_archive(path):
+            archives.append(path)
+        else:
+            yield path, monitor.register_file_status(path, registered_by)
+    yield from monitor.iter_register_archives(archives, registered_by, file_extension)
+
+
+def iter_verify(monitor, paths, file_extension):
+    archives = []
+    for path in paths:
+        if os.path.isdir(path):
+            yield from monitor.iter_verify_directory(path, file_extension)
+        elif is_archive(path):
+            archives.append(path)
+        else:
+            yield path, monitor.verify_file(path)
+    yield from monitor.iter_verify_archives(archives, file_extension)
+
+
+def cmd_register(monitor, args, out):
+    exit_code = EXIT_OK
+    for filepath, status in iter_register(monitor, args.paths, args.registered_by, args.ext):
+        #Files registered by an earlier run are expected on cron reruns
+        emit(out, {"path": filepath, "status": status})
+        if status == "error":
+            exit_code = EXIT_ERROR
+    return exit_code
+
+
+def cmd_verify(monitor, args, out):
+    exit_code = EXIT_OK
+    for filepath, result in iter_verify(monitor, args.paths, args.ext):
+        emit(out, {"path": filepath, **result})
+        if result["status"] == "tampered":
+            exit_code = EXIT_TAMPERED
+        elif result["status"] in ("error", "unregistered") and exit_code == EXIT_OK:
+            exit_code = EXIT_ERROR
+    return exit_code
+
+
+def cmd_approve(monitor, args, out):
+    approved = monitor.approve_edit(args.path, args.edit_type, args.description,
+                                    args.approved_by, args.software)
+    emit(out, {"path": args.path, "status": "approved" if approved else "not_approved"})
+    return EXIT_OK if approved else EXIT_ERROR
+
+
+def cmd_report(monitor, args, out):
+    monitor.generate_report(args.output)
+    emit(out, {"path": args.output, "status": "report_generated"})
+    return EXIT_OK
+
+
+def cmd_history(monitor, args, out):
+    if not monitor.is_registered(args.path):
+        emit(out, {"path": args.path, "status": "unregistered"})
+        return EXIT_ERROR
+    for edit_date, edit_type, edit_description, approved_by, software_used in monitor.get_edit_history(args.path):
+        emit(out, {
+            "path": args.path,
+            "edit_date": edit_date,
+            "edit_type": edit_type,
+            "edit_description": edit_description,
+            "approved_by": approved_by,
+            "software_used": software_used,
+        })
+    return EXIT_OK
+
+
+def cmd_audit(monitor, args, out):
+    result = monitor.verify_audit_log(full=args.full)
+    emit(out, result)
+    if result["status"] == "tampered":
+        return EXIT_TAMPERED
+    return EXIT_ERROR if result["status"] == "error" else EXIT_OK
+
+
+def run_exit_code(status):
+    #A run is only clean once every shard is done and every file verified
+    if status["tampered"]:
+        return EXIT_TAMPERED
+    unfinished = any(state in status["shards"] for state in ("pending", "leased", "failed"))
+    errors = status["results"].get("error", 0) + status["results"].get("unregistered", 0)
+    #Files that dropped out of their shard (e.g. removed mid-run) were never checked
+    expected = sum(counts["files"] for counts in status["shards"].values())
+    unchecked = sum(status["results"].values()) < expected
+    if unfinished or errors or unchecked or not status["shards"]:
+        return EXIT_ERROR
+    return EXIT_OK
+
+
+def cmd_shard(monitor, args, out):
+    coordinator = VerificationCoordinator(args.db)
+    run_id = coordinator.create_run(args.shard_by, args.size, args.hash_shards)
+    if not run_id:
+        return EXIT_ERROR
+    emit(out, coordinator.run_status(run_id))
+    return EXIT_OK
+
+
+def cmd_worker(monitor, args, out):
+    if args.processes > 1:
+        status = run_workers(args.db, args.run_id, args.processes, args.lease)
+    else:
+        worker = VerificationWorker(args.db, lease_seconds=args.lease)
+        for result in worker.iter_run(args.run_id):
+            emit(out, result)
+        status = VerificationCoordinator(args.db).run_status(args.run_id)
+    emit(out, status)
+    return run_exit_code(status)
+
+
+def cmd_status(monitor, args, out):
+    status = VerificationCoordinator(args.db).run_status(args.run_id)
+    emit(out, status)
+    return run_exit_code(status)
+
+
+def cmd_archive(monitor, args, out):
+    emit(out, monitor.archive_old_records(args.days))
+    return EXIT_OK
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer: {value}")
+    return number
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="integrity_cli",
+                                     description="ChemiDoc File Integrity Monitoring System")
+    parser.add_argument("--db", default="lab_image_integrity.db", help="integrity database path")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    register = commands.add_parser("register", help="register files, archives or directories")
+    register.add_argument("paths", nargs="+")
+    register.add_argument("--by", dest="registered_by", default="Lab Technician")
+    register.add_argument("--ext", default=".scn", help="extension to pick up in directories/archives")
+    register.set_defaults(func=cmd_register)
+
+    verify = commands.add_parser("verify", help="verify files, archives or directories")
+    verify.add_argument("paths", nargs="+")
+    verify.add_argument("--ext", default=".scn", help="extension to pick up in directories/archives")
+    verify.set_defaults(func=cmd_verify)
+
+    approve = commands.add_parser("approve", help="approve a legitimate edit")
+    approve.add_argument("path")
+    approve.add_argument("--type", dest="edit_type", required=True)
+    approve.add_argument("--description", required=True)
+    approve.add_argument("--by", dest="approved_by", required=True)
+    approve.add_argument("--software", default="Image Lab")
+    approve.set_defaults(func=cmd_approve)
+
+    report = commands.add_parser("report", help="write the compliance report")
+    report.add_argument("--output", default="integrity_report.txt")
+    report.set_defaults(func=cmd_report)
+
+    history = commands.add_parser("history", help="show the approved edits of a file")
+    history.add_argument("path")
+    history.set_defaults(func=cmd_history)
+
+    audit = commands.add_parser("audit", help="check the audit log against its checkpoints",
+                                description="By default only entries added after the last exported checkpoint "
+                                            "are rechecked against their file_hashes/edit_history rows; use "
+                                            "--full to recheck every row.")
+    audit.add_argument("--full", action="store_true",
+                       help="recheck the source rows of every entry, not just those after the last checkpoint")
+    audit.set_defaults(func=cmd_audit)
+
+    shard = commands.add_parser("shard", help="split the registered files into a sharded verification run")
+    shard.add_argument("--by", dest="shard_by", choices=["path", "hash"], default="path")
+    shard.add_argument("--size", type=positive_int, default=10000, help="files per shard when sharding by path")
+    shard.add_argument("--hash-shards", type=positive_int, default=16,
+                       help="number of shards when sharding by hash")
+    shard.set_defaults(func=cmd_shard)
+
+    worker = commands.add_parser("worker", help="claim and verify shards of a run until none are left")
+    worker.add_argument("run_id")
+    worker.add_argument("--processes", type=positive_int, default=1)
+    worker.add_argument("--lease", type=positive_int, default=300, help="lease length in seconds")
+    worker.set_defaults(func=cmd_worker)
+
+    status = commands.add_parser("status", help="progress and results of a sharded run")
+    status.add_argument("run_id")
+    status.set_defaults(func=cmd_status)
+
+    archive = commands.add_parser("archive", help="move old edit/verification records to yearly archives")
+    archive.add_argument("--days", type=int, default=365, help="keep this many days in the main database")
+    archive.set_defaults(func=cmd_archive)
+
+    return parser
+
+
+def main(argv = None):
+    args = build_parser().parse_args(argv)
+    out = sys.stdout
+
+    #The monitor prints progress messages; keep stdout for JSON Lines only
+    with redirect_stdout(sys.stderr):
+        try:
+            monitor = FileIntegrityMonitor(args.db)
+            return args.func(monitor, args, out)
+        except Exception as e:
+            #Python's own exit status for a crash is 1, which would read as tampering
+            print(f"Error: {args.command} failed: {e}")
+            emit(out, {"command": args.command, "status": "error", "message": f"{type(e).__name__}: {e}"})
+            return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Project: ChemiDoc File Integrity Monitoring System
+Purpose: Versions the database schema and upgrades older databases in place
+Schema versions (stored in PRAGMA user_version):
+1 - legacy file_hashes(file_hash, ...) layout (file_integrity.db)
+2 - original_hash/current_hash + edit_history layout (lab_image_integrity.db)
+3 - indexes used by verification, edit lookups and sharded runs
+4 - change_seq on file_hashes so in-memory indexes can refresh incrementally
+5 - audit chain; rows written before it are sealed once, here
+6 - original_hash index for hash-sharded verification runs
+Data is rewritten in small batches, each in its own transaction, so other
+processes are never locked out for long. A legacy (v1) database is copied
+to <db>.v1.bak before it is rewritten.
+"""
+
+import os
+import sqlite3
+
+from audit_chain import AuditChain, create_tables
+
+
+def table_columns(cursor, table):
+    cursor.execute(f'PRAGMA table_info({table})')
+    return [row[1] for row in cursor.fetchall()]
+
+
+def detect_version(conn):
+    cursor = conn.cursor()
+    cursor.execute('PRAGMA user_version')
+    version = cursor.fetchone()[0]
+    if version:
+        return version
+
+    #Databases created before versioning: work it out from the columns
+    columns = table_columns(cursor, "file_hashes")
+    if not columns:
+        return 0
+    if "file_hash" in columns:
+        return 1
+    return 2
+
+
+def set_version(conn, version):
+    conn.execute(f'PRAGMA user_version = {int(version)}')
+    conn.commit()
+
+
+def migrate_1_to_2(conn, batch_size):
+    cursor = conn.cursor()
+    columns = table_columns(cursor, "file_hashes")
+
+    #Renaming and adding columns only touch the schema, not the rows
+    if "file_hash" in columns:
+        cursor.execute('ALTER TABLE file_hashes RENAME COLUMN file_hash TO original_hash')
+    if "current_hash" not in columns:
+        cursor.execute('ALTER TABLE file_hashes ADD COLUMN current_hash TEXT')
+    if "last_modified" not in columns:
+        cursor.execute('ALTER TABLE file_hashes ADD COLUMN last_modified TEXT')
+    if "notes" not in columns:
+        cursor.execute('ALTER TABLE file_hashes ADD COLUMN notes TEXT')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS edit_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_id INTEGER NOT NULL,
+            edit_date TEXT NOT NULL,
+            edit_type TEXT NOT NULL,
+            edit_description TEXT NOT NULL,
+            previous_hash TEXT NOT NULL,
+            new_hash TEXT NOT NULL,
+            approved_by TEXT NOT NULL,
+            software_used TEXT DEFAULT 'Image Lab',
+            FOREIGN KEY (file_id) REFERENCES file_hashes(id)
+        )
+    ''')
+    conn.commit()
+
+    #Fill current_hash in batches; safe to interrupt and rerun
+    cursor.execute('SELECT MIN(id), MAX(id) FROM file_hashes')
+    low, high = cursor.fetchone()
+    if low is None:
+        return
+    for start in range(low, high + 1, batch_size):
+        cursor.execute('''
+            UPDATE file_hashes
+            SET current_hash = original_hash,
+                notes = COALESCE(notes, 'Migrated from legacy schema')
+            WHERE id >= ? AND id < ? AND current_hash IS NULL
+        ''', (start, start + batch_size))
+        conn.commit()
+
+
+def migrate_2_to_3(conn, batch_size):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_edit_history_file_hash
+        ON edit_history (file_id, new_hash)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_file_hashes_current_hash
+        ON file_hashes (current_hash)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_file_hashes_created_date
+        ON file_hashes (created_date)
+    ''')
+    conn.commit()
+
+
+def migrate_3_to_4(conn, batch_size):
+    cursor = conn.cursor()
+    if "change_seq" not in table_columns(cursor, "file_hashes"):
+        cursor.execute('ALTER TABLE file_hashes ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_file_hashes_change_seq
+        ON file_hashes (change_seq)
+    ''')
+
+    #Single-row counter bumped on every insert/update/delete of file_hashes
+    cursor.execute('CREATE TABLE IF NOT EXISTS file_hashes_counter (value INTEGER NOT NULL)')
+    cursor.execute('INSERT INTO file_hashes_counter (value) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM file_hashes_counter)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS file_hashes_removed (
+            file_id INTEGER NOT NULL,
+            change_seq INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_file_hashes_removed_seq
+        ON file_hashes_removed (change_seq)
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS file_hashes_change_insert AFTER INSERT ON file_hashes
+        BEGIN
+            UPDATE file_hashes_counter SET value = value + 1;
+            UPDATE file_hashes SET change_seq = (SELECT value FROM file_hashes_counter) WHERE id = NEW.id;
+        END
+    ''')
+    #change_seq is left out of the column list so the trigger does not fire itself
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS file_hashes_change_update
+        AFTER UPDATE OF filename, filepath, original_hash, current_hash, file_size,
+                        created_date, last_verified, last_modified, status, notes ON file_hashes
+        BEGIN
+            UPDATE file_hashes_counter SET value = value + 1;
+            UPDATE file_hashes SET change_seq = (SELECT value FROM file_hashes_counter) WHERE id = NEW.id;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS file_hashes_change_delete AFTER DELETE ON file_hashes
+        BEGIN
+            UPDATE file_hashes_counter SET value = value + 1;
+            INSERT INTO file_hashes_removed (file_id, change_seq)
+            SELECT OLD.id, value FROM file_hashes_counter;
+        END
+    ''')
+    conn.commit()
+
+
+def migrate_4_to_5(conn, batch_size):
+    cursor = conn.cursor()
+    create_tables(cursor)
+    conn.commit()
+
+    #The only place pre-existing rows are chained; from v5 on an unsealed row is tampering
+    db_path = cursor.execute('PRAGMA database_list').fetchone()[2]
+    sealed = AuditChain(db_path).seal_existing(cursor, batch_size)
+    if sealed:
+        print(f"Audit chain: sealed {sealed} existing record(s)")
+
+
+def migrate_5_to_6(conn, batch_size):
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_file_hashes_original_hash
+        ON file_hashes (original_hash)
+    ''')
+    conn.commit()
+
+
+def backup_database(conn, db_path, version):
+    #Online copy through the sqlite backup API; an existing backup is never overwritten
+    backup_path = f"{db_path}.v{version}.bak"
+    if os.path.exists(backup_path):
+        return backup_path
+    backup = sqlite3.connect(backup_path)
+    try:
+        conn.backup(backup)
+    finally:
+        backup.close()
+    print(f"Backed up {db_path} to {backup_path}")
+    return backup_path
+
+
+#(version it upgrades to, function) - append new migrations here
+MIGRATIONS = [
+    (2, migrate_1_to_2),
+    (3, migrate_2_to_3),
+    (4, migrate_3_to_4),
+    (5, migrate_4_to_5),
+    (6, migrate_5_to_6),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate_database(db_path, batch_size = 5000):
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        version = detect_version(conn)
+        if version == 0:
+            #Nothing to upgrade; the caller creates the current layout
+            return 0
+        if version > LATEST_VERSION:
+            print(f"Warning: {db_path} uses schema v{version}, newer than this code (v{LATEST_VERSION})")
+            return version
+        if version == 1:
+            #The v1 -> v2 step renames columns and rewrites every row
+            backup_database(conn, db_path, version)
+
+        for target, migration in MIGRATIONS:
+            if version < target:
+                print(f"Migrating {db_path}: schema v{version} -> v{target}")
+                migration(conn, batch_size)
+                set_version(conn, target)
+                version = target
+        return version
+    finally:
+        conn.close()
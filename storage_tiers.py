@@ -0,0 +1,359 @@
+"""
+Project: ChemiDoc File Integrity Monitoring System
+Purpose: Tiered storage for old edit and verification records
+The hot database keeps the monitored files and recent history. Older
+edit_history rows and finished sharded verification jobs are moved into one
+archive database per year. Archived edits are stored in compressed blocks of
+up to EDIT_BLOCK_SIZE rows, their audit_log payloads are dropped from the hot
+database (the audit rebuilds them from the archive, and the entry hashes
+still pin them) and the freed pages are handed back to the file system.
+The archive files are made read-only once written; readers open them with
+mode=ro. The query helpers here merge hot and archived records so callers
+do not need to know which tier a record is in.
+"""
+
+import glob
+import json
+import lzma
+import os
+import sqlite3
+import stat
+import zlib
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from audit_chain import edit_payload, entry_hash
+
+
+EDIT_COLUMNS = ("id", "file_id", "edit_date", "edit_type", "edit_description",
+                "previous_hash", "new_hash", "approved_by", "software_used")
+EDIT_BLOCK_SIZE = 1000
+#A block is well under 1 MB, so a 1 MB dictionary does as well as preset 9's 64 MB one
+BLOCK_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 9, "dict_size": 1 << 20}]
+
+
+def pack(record):
+    return zlib.compress(json.dumps(record).encode("utf-8"), 9)
+
+
+def unpack(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+def pack_block(rows):
+    #Column by column: ids, dates and names next to their own kind compress far better than rows
+    columns = [list(column) for column in zip(*rows)]
+    data = json.dumps(columns, separators=(",", ":")).encode("utf-8")
+    return lzma.compress(data, format=lzma.FORMAT_XZ, filters=BLOCK_FILTERS)
+
+
+def unpack_block(blob):
+    return [tuple(row) for row in zip(*json.loads(lzma.decompress(blob)))]
+
+
+class TieredStorage:
+    def __init__(self, db_path = "lab_image_integrity.db", archive_dir = None, retention_days = 365):
+        self.db_path = db_path
+        stem = os.path.splitext(os.path.basename(db_path))[0]
+        if archive_dir is None:
+            archive_dir = os.path.join(os.path.dirname(db_path), f"{stem}_archive")
+        self.archive_dir = archive_dir
+        self.stem = stem
+        self.retention_days = retention_days
+        self._readers = {}
+        self._archive_paths = None
+        self._block_ranges = {}
+        #Decompressed edit blocks by (archive path, block id); audits and reports read them in order
+        self._block = lru_cache(maxsize=64)(self._read_block)
+
+    def archive_path(self, year):
+        return os.path.join(self.archive_dir, f"{self.stem}_{year}.db")
+
+    #Read side - cached read-only connections, oldest year first
+    def readers(self):
+        if self._archive_paths is None:
+            self._archive_paths = sorted(glob.glob(os.path.join(self.archive_dir, f"{self.stem}_*.db")))
+        for path in self._archive_paths:
+            if path not in self._readers:
+                self._readers[path] = sqlite3.connect(f"file:{path}?mode=ro", uri=True,
+                                                      check_same_thread=False)
+        return list(self._readers.items())
+
+    def refresh(self):
+        #Picks up archive files and blocks written since the file list was cached
+        self.close()
+        self._archive_paths = None
+        self._block_ranges = {}
+        self._block.cache_clear()
+
+    def close(self):
+        for conn in self._readers.values():
+            conn.close()
+        self._readers = {}
+
+    def _read_block(self, path, block_id):
+        #{edit id: row}, in id order
+        row = self._readers[path].execute('SELECT records FROM archived_edit_blocks WHERE id = ?',
+                                          (block_id,)).fetchone()
+        return {edit[0]: edit for edit in unpack_block(row[0])}
+
+    def _ranges(self, path, conn):
+        #(first ids, [(first, last, block id)]) sorted by first id, read once per archive file
+        if path not in self._block_ranges:
+            ranges = conn.execute('''
+                SELECT first_edit_id, last_edit_id, id FROM archived_edit_blocks ORDER BY first_edit_id
+            ''').fetchall()
+            self._block_ranges[path] = ([r[0] for r in ranges], ranges)
+        return self._block_ranges[path]
+
+    def archived_edits(self, file_id):
+        #Edit rows as tuples in EDIT_COLUMNS order
+        edits = []
+        for path, conn in self.readers():
+            for (block_id,) in conn.execute('SELECT block_id FROM archived_edit_files WHERE file_id = ?',
+                                            (file_id,)):
+                edits.extend(row for row in self._block(path, block_id).values() if row[1] == file_id)
+        return edits
+
+    def iter_archived_edits(self):
+        #Every archived edit row, one block at a time - for reports over all files
+        for _, conn in self.readers():
+            for (blob,) in conn.execute('SELECT records FROM archived_edit_blocks ORDER BY id'):
+                yield from unpack_block(blob)
+
+    def find_edit(self, edit_id):
+        for path, conn in self.readers():
+            firsts, ranges = self._ranges(path, conn)
+            i = bisect_right(firsts, edit_id) - 1
+            #Blocks only overlap when ids were archived out of order, so try the nearest one first
+            nearest = ranges[i:i + 1] if i >= 0 else []
+            others = [r for r in ranges[:max(i, 0)] if r[1] >= edit_id]
+            for first, last, block_id in nearest + others:
+                if first <= edit_id <= last:
+                    row = self._block(path, block_id).get(edit_id)
+                    if row:
+                        return row
+        return None
+
+    def is_archived_edit(self, file_id, new_hash):
+        #Only archived edits that reproduce their audit_log entry count as approvals;
+        #a row slipped into an archive file is ignored
+        candidates = [row for row in self.archived_edits(file_id) if row[6] == new_hash]
+        if not candidates:
+            return False
+
+        hot = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            for row in candidates:
+                entry = hot.execute('''
+                    SELECT seq, prev_hash, entry_hash FROM audit_log WHERE event_type = 'edit' AND source_id = ?
+                ''', (row[0],)).fetchone()
+                if entry and entry_hash(entry[0], entry[1], "edit", edit_payload(row[1:])) == entry[2]:
+                    return True
+        finally:
+            hot.close()
+        return False
+
+    def archived_verifications(self, run_id = None):
+        records = []
+        for _, conn in self.readers():
+            if run_id:
+                cursor = conn.execute('SELECT record FROM archived_verifications WHERE run_id = ?', (run_id,))
+            else:
+                cursor = conn.execute('SELECT record FROM archived_verifications ORDER BY finished_date')
+            records.extend(unpack(blob) for (blob,) in cursor)
+        return records
+
+    #Write side
+    def _open_writer(self, year):
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = self.archive_path(year)
+        if os.path.exists(path):
+            os.chmod(path, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IROTH)
+
+        conn = sqlite3.connect(path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS archived_edit_blocks (
+                id INTEGER PRIMARY KEY,
+                first_edit_id INTEGER NOT NULL,
+                last_edit_id INTEGER NOT NULL,
+                record_count INTEGER NOT NULL,
+                records BLOB NOT NULL
+            )
+        ''')
+        #Which blocks hold a file's edits - one row per file and block, not per edit
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS archived_edit_files (
+                file_id INTEGER NOT NULL,
+                block_id INTEGER NOT NULL,
+                PRIMARY KEY (file_id, block_id)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS archived_verifications (
+                job_id INTEGER PRIMARY KEY,
+                run_id TEXT NOT NULL,
+                finished_date TEXT,
+                record BLOB NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_archived_verifications_run ON archived_verifications (run_id)')
+        conn.commit()
+        return conn
+
+    def _seal(self, year):
+        #Archive files are read-only between archiving runs
+        path = self.archive_path(year)
+        os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+    def archive_old_records(self, retention_days = None, batch_size = 5000):
+        retention_days = self.retention_days if retention_days is None else retention_days
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+        size_before = os.path.getsize(self.db_path)
+
+        moved_edits, payload_bytes = self._move_edits(cutoff, batch_size)
+        moved_jobs = self._move_verifications(cutoff, batch_size)
+        if moved_edits or moved_jobs:
+            self._reclaim_space(payload_bytes)
+        self.refresh()
+
+        freed = size_before - os.path.getsize(self.db_path)
+        print(f"Archived {moved_edits} edit record(s) and {moved_jobs} verification job(s) older than {cutoff[:10]}")
+        print(f"Database shrank by {freed // 1024} KB")
+        return {"edits": moved_edits, "verifications": moved_jobs, "cutoff": cutoff, "freed_bytes": freed}
+
+    def _move_edits(self, cutoff, batch_size):
+        #Returns (rows moved, bytes of audit payload emptied)
+        hot = sqlite3.connect(self.db_path, timeout=30)
+        moved = 0
+        payload_bytes = 0
+        touched = set()
+        try:
+            has_audit_log = hot.execute("SELECT 1 FROM sqlite_master WHERE name = 'audit_log'").fetchone()
+            while True:
+                rows = hot.execute(f'''
+                    SELECT {", ".join(EDIT_COLUMNS)} FROM edit_history
+                    WHERE edit_date < ? ORDER BY id LIMIT ?
+                ''', (cutoff, batch_size)).fetchall()
+                if not rows:
+                    break
+
+                #Write the archive first; rows already archived by a run that crashed are skipped
+                by_year = {}
+                for row in rows:
+                    by_year.setdefault(row[2][:4], []).append(row)
+                for year, year_rows in by_year.items():
+                    archive = self._open_writer(year)
+                    done = self._archived_ids(archive, year_rows[0][0], year_rows[-1][0])
+                    pending = [row for row in year_rows if row[0] not in done]
+                    for i in range(0, len(pending), EDIT_BLOCK_SIZE):
+                        self._write_block(archive, pending[i:i + EDIT_BLOCK_SIZE])
+                    archive.commit()
+                    archive.close()
+                    touched.add(year)
+
+                ids = [(row[0],) for row in rows]
+                hot.executemany('DELETE FROM edit_history WHERE id = ?', ids)
+                if has_audit_log:
+                    payload_bytes += hot.execute('''
+                        SELECT COALESCE(SUM(LENGTH(payload)), 0) FROM audit_log
+                        WHERE event_type = 'edit' AND source_id BETWEEN ? AND ?
+                    ''', (rows[0][0], rows[-1][0])).fetchone()[0]
+                    #The audit rebuilds these payloads from the archive; entry_hash still pins them
+                    hot.executemany('''
+                        UPDATE audit_log SET payload = '' WHERE event_type = 'edit' AND source_id = ?
+                    ''', ids)
+                hot.commit()
+                moved += len(rows)
+        finally:
+            hot.close()
+            for year in touched:
+                self._seal(year)
+        return moved, payload_bytes
+
+    def _write_block(self, archive, rows):
+        cursor = archive.execute('''
+            INSERT INTO archived_edit_blocks (first_edit_id, last_edit_id, record_count, records)
+            VALUES (?, ?, ?, ?)
+        ''', (rows[0][0], rows[-1][0], len(rows), pack_block(rows)))
+        archive.executemany('INSERT OR IGNORE INTO archived_edit_files (file_id, block_id) VALUES (?, ?)',
+                            [(file_id, cursor.lastrowid) for file_id in {row[1] for row in rows}])
+
+    def _archived_ids(self, archive, low, high):
+        ids = set()
+        for (blob,) in archive.execute('''
+            SELECT records FROM archived_edit_blocks WHERE last_edit_id >= ? AND first_edit_id <= ?
+        ''', (low, high)):
+            ids.update(row[0] for row in unpack_block(blob))
+        return ids
+
+    def _reclaim_space(self, payload_bytes = 0):
+        #Deleted rows only go to the freelist; hand those pages back so the file (and backups) shrink
+        hot = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            incremental = hot.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+            size = os.path.getsize(self.db_path)
+            if not incremental or payload_bytes * 4 > size:
+                #Emptied audit payloads leave audit_log pages part-filled, which only a VACUUM
+                #compacts; it is also the only way to switch an older database to incremental mode
+                hot.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                hot.execute('VACUUM')
+            else:
+                #executescript steps the pragma to the end; one execute() frees a single page
+                hot.executescript('PRAGMA incremental_vacuum')
+        finally:
+            hot.close()
+
+    def _move_verifications(self, cutoff, batch_size):
+        hot = sqlite3.connect(self.db_path, timeout=30)
+        moved = 0
+        touched = set()
+        try:
+            if not hot.execute("SELECT 1 FROM sqlite_master WHERE name = 'verify_jobs'").fetchone():
+                return 0
+
+            while True:
+                jobs = hot.execute('''
+                    SELECT id, run_id, shard_by, range_low, range_high, file_count, status,
+                           worker_id, attempts, created_date, finished_date, summary
+                    FROM verify_jobs
+                    WHERE status IN ('done', 'failed') AND finished_date < ?
+                    ORDER BY id LIMIT ?
+                ''', (cutoff, batch_size)).fetchall()
+                if not jobs:
+                    break
+
+                by_year = {}
+                for job in jobs:
+                    results = hot.execute('''
+                        SELECT filepath, status, message FROM verify_job_results WHERE job_id = ?
+                    ''', (job[0],)).fetchall()
+                    record = {
+                        "job": dict(zip(("id", "run_id", "shard_by", "range_low", "range_high", "file_count",
+                                         "status", "worker_id", "attempts", "created_date",
+                                         "finished_date", "summary"), job)),
+                        "results": [list(r) for r in results],
+                    }
+                    by_year.setdefault(job[10][:4], []).append((job[0], job[1], job[10], pack(record)))
+
+                for year, records in by_year.items():
+                    archive = self._open_writer(year)
+                    archive.executemany('''
+                        INSERT OR IGNORE INTO archived_verifications (job_id, run_id, finished_date, record)
+                        VALUES (?, ?, ?, ?)
+                    ''', records)
+                    archive.commit()
+                    archive.close()
+                    touched.add(year)
+
+                ids = [(job[0],) for job in jobs]
+                hot.executemany('DELETE FROM verify_job_results WHERE job_id = ?', ids)
+                hot.executemany('DELETE FROM verify_jobs WHERE id = ?', ids)
+                hot.commit()
+                moved += len(jobs)
+        finally:
+            hot.close()
+            for year in touched:
+                self._seal(year)
+        return moved
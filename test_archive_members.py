@@ -0,0 +1,79 @@
+"""
+Project: ChemiDoc File Integrity Monitoring System
+Purpose: Tests for monitoring files inside zip/tar archives
+Run with: python -m pytest -q test_archive_members.py
+"""
+
+import tarfile
+import zipfile
+
+import pytest
+
+from archive_members import member_path
+from file_integrity_monitor import FileIntegrityMonitor
+
+
+def write_zip(path, members):
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+
+def write_tar(path, members, directory):
+    with tarfile.open(path, "w:gz") as archive:
+        for name, data in members.items():
+            source = directory / name
+            source.write_bytes(data)
+            archive.add(str(source), arcname=name)
+
+
+@pytest.fixture
+def monitor(tmp_path):
+    return FileIntegrityMonitor(str(tmp_path / "integrity.db"))
+
+
+MEMBERS = {"lane_1.scn": b"scan data 1", "lane_2.scn": b"scan data 2", "notes.txt": b"not monitored"}
+
+
+def test_zip_members_register_and_verify(monitor, tmp_path):
+    archive = str(tmp_path / "gels.zip")
+    write_zip(archive, MEMBERS)
+
+    assert monitor.register_archive(archive) == 2
+    assert monitor.is_registered(member_path(archive, "lane_1.scn"))
+    assert not monitor.is_registered(member_path(archive, "notes.txt"))
+
+    results = monitor.verify_archive(archive)
+    assert sorted(results) == [member_path(archive, "lane_1.scn"), member_path(archive, "lane_2.scn")]
+    assert all(result["status"] == "verified" for result in results.values())
+    assert monitor.verify_file(member_path(archive, "lane_2.scn"))["status"] == "verified"
+
+
+def test_tampered_zip_member_is_detected(monitor, tmp_path):
+    archive = str(tmp_path / "gels.zip")
+    write_zip(archive, MEMBERS)
+    monitor.register_archive(archive)
+
+    write_zip(archive, dict(MEMBERS, **{"lane_1.scn": b"scan data 1 edited"}))
+    results = monitor.verify_archive(archive)
+    assert results[member_path(archive, "lane_1.scn")]["status"] == "tampered"
+    assert results[member_path(archive, "lane_2.scn")]["status"] == "verified"
+
+
+def test_missing_tar_member_is_reported(monitor, tmp_path):
+    archive = str(tmp_path / "gels.tar.gz")
+    write_tar(archive, MEMBERS, tmp_path)
+    assert monitor.register_archive(archive) == 2
+
+    write_tar(archive, {"lane_2.scn": MEMBERS["lane_2.scn"]}, tmp_path)
+    results = monitor.verify_archive(archive)
+    assert results[member_path(archive, "lane_1.scn")] == {"status": "error", "message": "File not found"}
+    assert results[member_path(archive, "lane_2.scn")]["status"] == "verified"
+    assert monitor.verify_file(member_path(archive, "lane_1.scn"))["status"] == "error"
+
+
+def test_unreadable_archive_is_an_error(monitor, tmp_path):
+    archive = tmp_path / "broken.zip"
+    archive.write_bytes(b"not a zip file")
+    results = monitor.verify_archive(str(archive))
+    assert results[str(archive)]["status"] == "error"
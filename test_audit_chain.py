@@ -0,0 +1,190 @@
+"""
+Project: ChemiDoc File Integrity Monitoring System
+Purpose: Tests for the audit chain - Merkle inclusion proofs and tamper detection
+Run with: python -m pytest -q test_audit_chain.py
+"""
+
+import sqlite3
+
+import pytest
+
+from audit_chain import AuditChain, verify_inclusion
+from file_integrity_monitor import FileIntegrityMonitor
+
+
+def make_files(directory, count):
+    paths = []
+    for i in range(count):
+        path = directory / f"image_{i:03d}.scn"
+        path.write_bytes(f"scan data {i}".encode("utf-8"))
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def monitor(tmp_path):
+    monitor = FileIntegrityMonitor(str(tmp_path / "integrity.db"))
+    for path in make_files(tmp_path, 5):
+        monitor.register_file(path)
+    return monitor
+
+
+def execute(monitor, sql, params = ()):
+    conn = sqlite3.connect(monitor.db_path)
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def problems(result):
+    return " | ".join(result.get("problems", []))
+
+
+def test_inclusion_proofs_for_every_tree_size(tmp_path):
+    monitor = FileIntegrityMonitor(str(tmp_path / "integrity.db"))
+    paths = make_files(tmp_path, 33)
+    chain = monitor.audit_chain
+    conn = sqlite3.connect(monitor.db_path)
+    cursor = conn.cursor()
+
+    for tree_size, path in enumerate(paths, 1):
+        monitor.register_file(path)
+        root = chain.merkle_root(cursor, tree_size)
+        for seq in range(tree_size):
+            entry = cursor.execute('SELECT entry_hash FROM audit_log WHERE seq = ?', (seq,)).fetchone()[0]
+            proof = chain.inclusion_proof(cursor, seq, tree_size)
+            assert verify_inclusion(proof, entry, root), (seq, tree_size)
+            assert len(proof["path"]) < tree_size.bit_length()
+    conn.close()
+
+
+def test_inclusion_proof_rejects_wrong_entry_and_root(monitor):
+    chain = monitor.audit_chain
+    conn = sqlite3.connect(monitor.db_path)
+    cursor = conn.cursor()
+    root = chain.merkle_root(cursor, 5)
+    entry = cursor.execute('SELECT entry_hash FROM audit_log WHERE seq = 2').fetchone()[0]
+    other = cursor.execute('SELECT entry_hash FROM audit_log WHERE seq = 3').fetchone()[0]
+    proof = chain.inclusion_proof(cursor, 2, 5)
+    conn.close()
+
+    assert verify_inclusion(proof, entry, root)
+    assert not verify_inclusion(proof, other, root)
+    assert not verify_inclusion(proof, entry, "0" * 64)
+
+
+def test_clean_log_verifies(monitor):
+    assert monitor.verify_audit_log(full=True)["status"] == "verified"
+    assert monitor.verify_audit_log()["status"] == "verified"
+
+
+def test_modified_registration_is_detected(monitor):
+    execute(monitor, "UPDATE file_hashes SET original_hash = ? WHERE id = 2", ("ab" * 32,))
+    result = monitor.verify_audit_log(full=True)
+    assert result["status"] == "tampered"
+    assert "file_hashes row was modified" in problems(result)
+
+
+def test_forged_edit_row_is_detected(monitor):
+    execute(monitor, '''
+        INSERT INTO edit_history (file_id, edit_date, edit_type, edit_description,
+                                  previous_hash, new_hash, approved_by)
+        VALUES (1, '2024-01-01T00:00:00', 'crop', 'forged', 'aa', 'bb', 'Nobody')
+    ''')
+    result = monitor.verify_audit_log(full=True)
+    assert result["status"] == "tampered"
+    assert "edit_history row 1 has no audit entry" in problems(result)
+
+    #Constructing the monitor again must not seal the forged row
+    FileIntegrityMonitor(monitor.db_path)
+    assert monitor.verify_audit_log(full=True)["status"] == "tampered"
+
+
+def test_changed_current_hash_is_detected(monitor):
+    execute(monitor, "UPDATE file_hashes SET current_hash = ? WHERE id = 3", ("cd" * 32,))
+    result = monitor.verify_audit_log(full=True)
+    assert result["status"] == "tampered"
+    assert "current_hash does not match the last logged hash" in problems(result)
+
+
+def test_approved_edit_keeps_current_hash_consistent(monitor, tmp_path):
+    path = str(tmp_path / "image_001.scn")
+    with open(path, "ab") as f:
+        f.write(b" cropped")
+    assert monitor.approve_edit(path, "crop", "Cropped to lane 3", "PI")
+    assert monitor.verify_audit_log(full=True)["status"] == "verified"
+
+
+def test_rewritten_entry_is_detected(monitor):
+    execute(monitor, "UPDATE audit_log SET payload = REPLACE(payload, 'image_001', 'image_999') WHERE seq = 1")
+    result = monitor.verify_audit_log(full=True)
+    assert result["status"] == "tampered"
+    assert "Entry 1: entry hash does not match its contents" in problems(result)
+
+
+def test_deleted_entry_is_detected(monitor):
+    execute(monitor, "DELETE FROM audit_log WHERE seq = 2")
+    result = monitor.verify_audit_log(full=True)
+    assert result["status"] == "tampered"
+    assert "Entry 2 is missing" in problems(result)
+
+
+def test_incremental_audit_reports_its_scope(tmp_path):
+    db_path = str(tmp_path / "integrity.db")
+    monitor = FileIntegrityMonitor(db_path)
+    monitor.audit_chain = AuditChain(db_path, checkpoint_interval=3, edit_archive=monitor.tiers)
+    for path in make_files(tmp_path, 4):
+        monitor.register_file(path)
+
+    result = monitor.verify_audit_log()
+    assert result["status"] == "verified"
+    assert result["scope"] == "since_checkpoint"
+    assert result["start_entry"] == 3
+    assert "note" in result
+
+    #Rows of entries before the checkpoint are only rechecked by a full audit
+    execute(monitor, "UPDATE file_hashes SET filename = 'renamed.scn' WHERE id = 1")
+    assert monitor.verify_audit_log()["status"] == "verified"
+    assert monitor.verify_audit_log(full=True)["status"] == "tampered"
+
+    #Tampering with the checkpointed part of the log is still caught
+    execute(monitor, "UPDATE audit_log SET entry_hash = ? WHERE seq = 2", ("ef" * 32,))
+    assert monitor.verify_audit_log()["status"] == "tampered"
+
+
+def test_legacy_database_is_migrated_and_sealed_once(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE file_hashes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            filepath TEXT UNIQUE NOT NULL,
+            file_hash TEXT NOT NULL,
+            file_size INTEGER NOT NULL,
+            created_date TEXT NOT NULL,
+            last_verified TEXT,
+            status TEXT DEFAULT 'Original'
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO file_hashes (filename, filepath, file_hash, file_size, created_date)
+        VALUES ('old.scn', '/data/old.scn', ?, 10, '2023-05-01T09:00:00')
+    ''', ("12" * 32,))
+    conn.commit()
+
+    #The chain code leaves an unmigrated layout alone instead of crashing
+    assert AuditChain(db_path).verify_log(full=True)["status"] == "error"
+    conn.close()
+
+    monitor = FileIntegrityMonitor(db_path)
+    result = monitor.verify_audit_log(full=True)
+    assert result["status"] == "verified"
+    assert result["checked_entries"] == 1
+
+    execute(monitor, '''
+        INSERT INTO file_hashes (filename, filepath, original_hash, current_hash, file_size, created_date)
+        VALUES ('forged.scn', '/data/forged.scn', ?, ?, 10, '2023-05-02T09:00:00')
+    ''', ("34" * 32, "34" * 32))
+    FileIntegrityMonitor(db_path)
+    assert "file_hashes row 2 has no audit entry" in problems(monitor.verify_audit_log(full=True))
@@ -0,0 +1,95 @@
+"""
+Project: ChemiDoc File Integrity Monitoring System
+Purpose: Tests for the in-memory file index - incremental refresh and snapshots
+Run with: python -m pytest -q test_file_index.py
+"""
+
+import pytest
+
+from file_index import FileIndex
+from file_integrity_monitor import FileIntegrityMonitor
+
+
+def make_files(directory, count):
+    paths = []
+    for i in range(count):
+        path = directory / f"image_{i:03d}.scn"
+        path.write_bytes(f"scan data {i}".encode("utf-8"))
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def monitor(tmp_path):
+    monitor = FileIntegrityMonitor(str(tmp_path / "integrity.db"))
+    for path in make_files(tmp_path, 5):
+        monitor.register_file(path)
+    return monitor
+
+
+def test_load_matches_the_database(monitor, tmp_path):
+    index = monitor.load_index()
+    assert len(index) == 5
+    record = index.get(str(tmp_path / "image_002.scn"))
+    assert record.status == "Original"
+    assert record.current_hash == record.original_hash
+    assert index.find_by_hash(record.original_hash)[0].filepath == record.filepath
+    assert index.get(str(tmp_path / "missing.scn")) is None
+
+
+def test_refresh_picks_up_approved_edits(monitor, tmp_path):
+    index = monitor.load_index()
+    path = str(tmp_path / "image_001.scn")
+    before = index.get(path)
+
+    with open(path, "ab") as f:
+        f.write(b" cropped")
+    assert monitor.approve_edit(path, "crop", "Cropped to lane 3", "PI")
+    assert index.refresh() == 1
+
+    after = index.get(path)
+    assert after.current_hash == monitor.calculate_hash(path)
+    assert after.original_hash == before.original_hash
+    assert not index.find_by_hash(before.original_hash)
+    assert index.refresh() == 0
+
+
+def test_refresh_drops_removed_files(monitor, tmp_path):
+    index = monitor.load_index()
+    path = str(tmp_path / "image_003.scn")
+    file_hash = index.get(path).current_hash
+
+    monitor.remove_file(path)
+    assert index.refresh() == 1
+    assert len(index) == 4
+    assert index.get(path) is None
+    assert not index.find_by_hash(file_hash)
+    assert path not in [record.filepath for record in index]
+
+
+def test_snapshot_round_trip(monitor, tmp_path):
+    snapshot_path = str(tmp_path / "index.snap")
+    index = monitor.load_index()
+    monitor.remove_file(str(tmp_path / "image_000.scn"))
+    index.refresh()
+    index.save_snapshot(snapshot_path)
+
+    loaded = monitor.load_index(snapshot_path)
+    assert loaded._snapshot is not None, "an unchanged database keeps the snapshot mapped"
+    assert len(loaded) == 4
+    assert [(r.filepath, r.current_hash, r.status) for r in loaded] == \
+           [(r.filepath, r.current_hash, r.status) for r in index]
+
+    #Changes made after the snapshot are applied on load
+    new_path = tmp_path / "image_new.scn"
+    new_path.write_bytes(b"new scan")
+    monitor.register_file(str(new_path))
+    loaded = monitor.load_index(snapshot_path)
+    assert len(loaded) == 5
+    assert loaded.get(str(new_path)).status == "Original"
+
+
+def test_bad_snapshot_is_rejected(tmp_path):
+    snapshot_path = tmp_path / "index.snap"
+    snapshot_path.write_bytes(b"not a snapshot at all")
+    assert FileIndex.from_snapshot(str(snapshot_path)) is None
@@ -1,12 +1,15 @@
 from file_integrity_monitor import FileIntegrityMonitor
 
-monitor = FileIntegrityMonitor("file_integrity.db")
 
-print("---Registering File---")
-monitor.register_file("Project_Sample.scn")
+#Manual smoke test - guarded so test collection does not touch file_integrity.db
+if __name__ == "__main__":
+    monitor = FileIntegrityMonitor("file_integrity.db")
 
-print("\n---Verifying File---")
-result = monitor.verify_file("Project_Sample.scn")
-print(result["message"])
+    print("---Registering File---")
+    monitor.register_file("Project_Sample.scn")
 
-print("\n---File Hashed & Stored---")
\ No newline at end of file
+    print("\n---Verifying File---")
+    result = monitor.verify_file("Project_Sample.scn")
+    print(result["message"])
+
+    print("\n---File Hashed & Stored---")
\ No newline at end of file
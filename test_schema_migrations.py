@@ -0,0 +1,90 @@
+"""
+Project: ChemiDoc File Integrity Monitoring System
+Purpose: Tests for upgrading older database layouts in place
+Run with: python -m pytest -q test_schema_migrations.py
+"""
+
+import os
+import sqlite3
+
+import pytest
+
+from file_integrity_monitor import FileIntegrityMonitor
+from schema_migrations import LATEST_VERSION, detect_version, migrate_database, table_columns
+
+
+@pytest.fixture
+def legacy_db(tmp_path):
+    #Layout of file_integrity.db before original_hash/current_hash existed
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE file_hashes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            filepath TEXT UNIQUE NOT NULL,
+            file_hash TEXT NOT NULL,
+            file_size INTEGER NOT NULL,
+            created_date TEXT NOT NULL,
+            last_verified TEXT,
+            status TEXT DEFAULT 'Original'
+        )
+    ''')
+    conn.executemany('''
+        INSERT INTO file_hashes (filename, filepath, file_hash, file_size, created_date)
+        VALUES (?, ?, ?, 10, '2023-05-01T09:00:00')
+    ''', [(f"old_{i}.scn", f"/data/old_{i}.scn", f"{i:02d}" * 32) for i in range(7)])
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_legacy_database_is_migrated_to_latest(legacy_db):
+    assert migrate_database(legacy_db, batch_size=3) == LATEST_VERSION
+
+    conn = sqlite3.connect(legacy_db)
+    cursor = conn.cursor()
+    assert detect_version(conn) == LATEST_VERSION
+    columns = table_columns(cursor, "file_hashes")
+    assert "original_hash" in columns and "file_hash" not in columns
+    cursor.execute('SELECT COUNT(*) FROM file_hashes WHERE current_hash = original_hash')
+    assert cursor.fetchone()[0] == 7
+    cursor.execute('SELECT COUNT(*) FROM audit_log')
+    assert cursor.fetchone()[0] == 7
+    conn.close()
+
+    assert FileIntegrityMonitor(legacy_db).verify_audit_log(full=True)["status"] == "verified"
+
+
+def test_legacy_database_is_backed_up_first(legacy_db):
+    migrate_database(legacy_db)
+
+    backup_path = legacy_db + ".v1.bak"
+    assert os.path.exists(backup_path)
+    conn = sqlite3.connect(backup_path)
+    assert detect_version(conn) == 1
+    assert conn.execute('SELECT COUNT(*) FROM file_hashes').fetchone()[0] == 7
+    conn.close()
+
+
+def test_rerunning_the_migration_changes_nothing(legacy_db):
+    migrate_database(legacy_db)
+    conn = sqlite3.connect(legacy_db)
+    before = conn.execute('SELECT * FROM audit_log ORDER BY seq').fetchall()
+    conn.close()
+    backup_mtime = os.path.getmtime(legacy_db + ".v1.bak")
+
+    assert migrate_database(legacy_db) == LATEST_VERSION
+    FileIntegrityMonitor(legacy_db)
+
+    conn = sqlite3.connect(legacy_db)
+    assert conn.execute('SELECT * FROM audit_log ORDER BY seq').fetchall() == before
+    conn.close()
+    assert os.path.getmtime(legacy_db + ".v1.bak") == backup_mtime
+
+
+def test_new_database_needs_no_migration(tmp_path):
+    db_path = str(tmp_path / "new.db")
+    assert migrate_database(db_path) == 0
+    FileIntegrityMonitor(db_path)
+    assert migrate_database(db_path) == LATEST_VERSION
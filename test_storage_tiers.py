@@ -0,0 +1,132 @@
+"""
+Project: ChemiDoc File Integrity Monitoring System
+Purpose: Tests for moving old edit records into the yearly archives
+Run with: python -m pytest -q test_storage_tiers.py
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from file_integrity_monitor import FileIntegrityMonitor
+from storage_tiers import pack_block, unpack_block
+
+
+def make_files(directory, count):
+    paths = []
+    for i in range(count):
+        path = directory / f"image_{i:03d}.scn"
+        path.write_bytes(f"scan data {i}".encode("utf-8"))
+        paths.append(str(path))
+    return paths
+
+
+def edit(monitor, path, suffix):
+    with open(path, "ab") as f:
+        f.write(suffix)
+    assert monitor.approve_edit(path, "crop", f"Cropped {suffix.decode()}", "PI")
+
+
+@pytest.fixture
+def monitor(tmp_path):
+    monitor = FileIntegrityMonitor(str(tmp_path / "integrity.db"))
+    for path in make_files(tmp_path, 10):
+        monitor.register_file(path)
+        for i in range(3):
+            edit(monitor, path, f" edit {i}".encode("utf-8"))
+    return monitor
+
+
+def archive_everything(monitor):
+    #A negative retention puts the cutoff in the future, so every record is old enough
+    result = monitor.archive_old_records(retention_days=-1)
+    assert result["edits"] > 0
+    conn = sqlite3.connect(monitor.db_path)
+    assert conn.execute('SELECT COUNT(*) FROM edit_history').fetchone()[0] == 0
+    conn.close()
+    return result
+
+
+def test_archived_history_reads_the_same(monitor, tmp_path):
+    path = str(tmp_path / "image_004.scn")
+    history = monitor.get_edit_history(path)
+    archive_everything(monitor)
+
+    assert monitor.get_edit_history(path) == history
+    assert len(history) == 3
+    assert monitor.verify_file(path)["status"] == "verified"
+    assert monitor.verify_file_history(path)["status"] == "verified"
+
+
+def test_audit_verifies_after_archiving(monitor):
+    archive_everything(monitor)
+    result = monitor.verify_audit_log(full=True)
+    assert result["status"] == "verified", result.get("problems")
+
+    #A fresh process has no cached archive readers
+    assert FileIntegrityMonitor(monitor.db_path).verify_audit_log(full=True)["status"] == "verified"
+
+
+def test_archived_edit_still_approves_older_versions(monitor, tmp_path):
+    path = tmp_path / "image_007.scn"
+    older_version = path.read_bytes()
+    edit(monitor, str(path), b" edit 3")
+    archive_everything(monitor)
+
+    #Rolling back to an approved version matches an archived edit
+    path.write_bytes(older_version)
+    assert monitor.verify_file(str(path))["status"] == "approved_modifications"
+    path.write_bytes(b"never approved")
+    assert monitor.verify_file(str(path))["status"] == "tampered"
+
+
+def test_forged_archive_row_is_rejected(monitor, tmp_path):
+    archive_everything(monitor)
+    path = tmp_path / "image_002.scn"
+    path.write_bytes(b"tampered scan")
+    forged_hash = monitor.calculate_hash(str(path))
+    file_id = sqlite3.connect(monitor.db_path).execute(
+        'SELECT id FROM file_hashes WHERE filepath = ?', (str(path),)).fetchone()[0]
+
+    #Slip an approval for the tampered content into this year's archive file
+    year = str(datetime.now().year)
+    archive = monitor.tiers._open_writer(year)
+    rows = [(999, file_id, f"{year}-01-01T00:00:00", "crop", "forged", "aa" * 32, forged_hash, "Nobody", "Image Lab")]
+    monitor.tiers._write_block(archive, rows)
+    archive.commit()
+    archive.close()
+    monitor.tiers.refresh()
+
+    assert monitor.verify_file(str(path))["status"] == "tampered"
+
+
+def test_modified_archive_row_is_detected(monitor):
+    archive_everything(monitor)
+    archive_path = monitor.tiers.readers()[0][0]
+    monitor.tiers.close()
+    os.chmod(archive_path, 0o644)
+    conn = sqlite3.connect(archive_path)
+    block_id, blob = conn.execute('SELECT id, records FROM archived_edit_blocks ORDER BY id').fetchone()
+    rows = unpack_block(blob)
+    rows[0] = rows[0][:7] + ("Someone else",) + rows[0][8:]
+    conn.execute('UPDATE archived_edit_blocks SET records = ? WHERE id = ?', (pack_block(rows), block_id))
+    conn.commit()
+    conn.close()
+    monitor.tiers.refresh()
+
+    result = monitor.verify_audit_log(full=True)
+    assert result["status"] == "tampered"
+
+
+def test_archiving_shrinks_the_hot_database(monitor):
+    size_before = os.path.getsize(monitor.db_path)
+    result = archive_everything(monitor)
+
+    assert result["freed_bytes"] > 0
+    assert os.path.getsize(monitor.db_path) == size_before - result["freed_bytes"]
+    conn = sqlite3.connect(monitor.db_path)
+    assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    assert conn.execute("SELECT COUNT(*) FROM audit_log WHERE event_type = 'edit' AND payload != ''").fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,102 @@
+"""
+Project: ChemiDoc File Integrity Monitoring System
+Purpose: Tests for sharded verification runs - leases, reassignment and hash shards
+Run with: python -m pytest -q test_verification_queue.py
+"""
+
+import sqlite3
+
+import pytest
+
+from file_integrity_monitor import FileIntegrityMonitor
+from integrity_cli import EXIT_ERROR, EXIT_OK, run_exit_code
+from verification_queue import VerificationCoordinator, VerificationWorker
+
+
+def make_files(directory, count):
+    paths = []
+    for i in range(count):
+        path = directory / f"image_{i:03d}.scn"
+        path.write_bytes(f"scan data {i}".encode("utf-8"))
+        paths.append(str(path))
+    return paths
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = str(tmp_path / "integrity.db")
+    monitor = FileIntegrityMonitor(db_path)
+    for path in make_files(tmp_path, 20):
+        monitor.register_file(path)
+    return db_path
+
+
+def expire_lease(db_path, job_id):
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE verify_jobs SET lease_expires = 0 WHERE id = ?", (job_id,))
+    conn.commit()
+    conn.close()
+
+
+def test_expired_lease_is_reassigned(db_path):
+    run_id = VerificationCoordinator(db_path).create_run("path", shard_size=20)
+    first = VerificationWorker(db_path, worker_id="first")
+    second = VerificationWorker(db_path, worker_id="second")
+
+    job = first.claim(run_id)
+    assert second.claim(run_id) is None
+
+    #The first worker stalls past its lease, the second one takes the shard over
+    expire_lease(db_path, job[0])
+    assert second.claim(run_id) == job
+    assert not first.heartbeat(job[0])
+    assert first.report(job[0], {"verified": 20}, []) is None
+
+    result = second.verify_shard(job)
+    assert result["summary"] == {"verified": 20}
+    status = VerificationCoordinator(db_path).run_status(run_id)
+    assert status["shards"] == {"done": {"shards": 1, "files": 20}}
+    assert run_exit_code(status) == EXIT_OK
+
+
+def test_shard_fails_after_max_attempts(db_path):
+    run_id = VerificationCoordinator(db_path).create_run("path", shard_size=20)
+    for attempt in range(2):
+        job = VerificationWorker(db_path, max_attempts=2).claim(run_id)
+        expire_lease(db_path, job[0])
+
+    assert VerificationWorker(db_path, max_attempts=2).claim(run_id) is None
+    status = VerificationCoordinator(db_path).run_status(run_id)
+    assert status["shards"] == {"failed": {"shards": 1, "files": 20}}
+    assert run_exit_code(status) == EXIT_ERROR
+
+
+def test_edit_approved_mid_run_stays_in_its_hash_shard(db_path, tmp_path):
+    coordinator = VerificationCoordinator(db_path)
+    run_id = coordinator.create_run("hash", hash_shards=4)
+    worker = VerificationWorker(db_path)
+
+    #Approving an edit changes current_hash while the run is in progress
+    first_job = worker.claim(run_id)
+    worker.verify_shard(first_job)
+    for path in make_files(tmp_path, 20):
+        with open(path, "ab") as f:
+            f.write(b" cropped")
+        assert worker.monitor.approve_edit(path, "crop", "Cropped", "PI")
+    assert worker.run(run_id) > 0
+
+    status = coordinator.run_status(run_id)
+    assert sum(status["results"].values()) == 20
+    assert run_exit_code(status) == EXIT_OK
+
+
+def test_file_removed_mid_run_fails_the_run(db_path, tmp_path):
+    coordinator = VerificationCoordinator(db_path)
+    run_id = coordinator.create_run("path", shard_size=10)
+    FileIntegrityMonitor(db_path).remove_file(str(tmp_path / "image_003.scn"))
+    VerificationWorker(db_path).run(run_id)
+
+    status = coordinator.run_status(run_id)
+    assert "pending" not in status["shards"] and "leased" not in status["shards"]
+    assert sum(status["results"].values()) == 19
+    assert run_exit_code(status) == EXIT_ERROR
@@ -0,0 +1,409 @@
+"""
+Project: ChemiDoc File Integrity Monitoring System
+Purpose: Splits verification of the registered files into shards that any
+number of worker processes (on this host or on other hosts that mount the
+same database and image paths) can claim, verify and report back.
+Shards are leased; a worker that stops heartbeating loses its lease and the
+shard goes back to the queue.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import redirect_stdout
+from datetime import datetime
+from multiprocessing import Process
+
+from file_integrity_monitor import FileIntegrityMonitor
+from storage_tiers import TieredStorage
+from archive_members import split_member_path, iter_member_hashes
+
+
+def connect(db_path):
+    #Autocommit mode so claims can use BEGIN IMMEDIATE
+    return sqlite3.connect(db_path, timeout=30, isolation_level=None)
+
+
+class VerificationCoordinator:
+    def __init__(self, db_path = "lab_image_integrity.db"):
+        self.db_path = db_path
+        self.init_tables()
+
+    def init_tables(self):
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+
+        #One row per shard of a verification run
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS verify_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT NOT NULL,
+                shard_by TEXT NOT NULL,
+                range_low TEXT NOT NULL,
+                range_high TEXT,
+                file_count INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker_id TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_date TEXT NOT NULL,
+                finished_date TEXT,
+                summary TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_verify_jobs_run
+            ON verify_jobs (run_id, status)
+        ''')
+
+        #Files that did not verify clean, reported back by the workers
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS verify_job_results (
+                job_id INTEGER NOT NULL,
+                filepath TEXT NOT NULL,
+                status TEXT NOT NULL,
+                message TEXT,
+                FOREIGN KEY (job_id) REFERENCES verify_jobs(id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_verify_job_results_job
+            ON verify_job_results (job_id)
+        ''')
+        conn.close()
+
+    def create_run(self, shard_by = "path", shard_size = 10000, hash_shards = 16):
+        if shard_size < 1 or hash_shards < 1:
+            print("Error: Shard size and number of hash shards must be positive")
+            return None
+
+        if shard_by == "path":
+            shards = self._path_shards(shard_size)
+        elif shard_by == "hash":
+            shards = self._hash_shards(hash_shards)
+        else:
+            print(f"Error: Unknown shard type - {shard_by}")
+            return None
+        if not shards:
+            print("Error: No registered files to verify")
+            return None
+
+        run_id = uuid.uuid4().hex[:12]
+        created_date = datetime.now().isoformat()
+
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('BEGIN')
+        cursor.executemany('''
+            INSERT INTO verify_jobs (run_id, shard_by, range_low, range_high, file_count, created_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(run_id, shard_by, low, high, count, created_date) for low, high, count in shards])
+        cursor.execute('COMMIT')
+        conn.close()
+
+        print(f"Verification run {run_id}: {len(shards)} shard(s)")
+        return run_id
+
+    def _path_shards(self, shard_size):
+        #Contiguous ranges of sorted paths keep each shard on as few mounts as possible
+        conn = connect(self.db_path)
+        cursor = conn.execute('SELECT filepath FROM file_hashes ORDER BY filepath')
+        shards = []
+        low, count = None, 0
+        for (filepath,) in cursor:
+            if low is None:
+                low = filepath
+            count += 1
+            if count == shard_size:
+                shards.append((low, filepath, count))
+                low, count = None, 0
+        if low is not None:
+            shards.append((low, filepath, count))
+        conn.close()
+        return shards
+
+    def _hash_shards(self, hash_shards):
+        #Equal slices of the hex hash space; range_high is exclusive, None is open-ended.
+        #original_hash never changes, so an edit approved mid-run cannot move a file between shards
+        width = max(1, (hash_shards - 1).bit_length() + 3) // 4
+        space = 16 ** width
+        bounds = [format(space * i // hash_shards, f"0{width}x") for i in range(hash_shards)] + [None]
+
+        conn = connect(self.db_path)
+        shards = []
+        for low, high in zip(bounds, bounds[1:]):
+            if high is None:
+                count = conn.execute('SELECT COUNT(*) FROM file_hashes WHERE original_hash >= ?',
+                                     (low,)).fetchone()[0]
+            else:
+                count = conn.execute('''
+                    SELECT COUNT(*) FROM file_hashes WHERE original_hash >= ? AND original_hash < ?
+                ''', (low, high)).fetchone()[0]
+            if count:
+                shards.append((low, high, count))
+        conn.close()
+        return shards
+
+    def run_status(self, run_id):
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT status, COUNT(*), SUM(file_count) FROM verify_jobs
+            WHERE run_id = ? GROUP BY status
+        ''', (run_id,))
+        shards = {status: {"shards": n, "files": files} for status, n, files in cursor.fetchall()}
+
+        totals = {}
+        cursor.execute("SELECT summary FROM verify_jobs WHERE run_id = ? AND status = 'done'", (run_id,))
+        for (summary,) in cursor.fetchall():
+            for status, n in json.loads(summary).items():
+                totals[status] = totals.get(status, 0) + n
+
+        cursor.execute('''
+            SELECT r.filepath, r.status, r.message FROM verify_job_results r
+            JOIN verify_jobs j ON j.id = r.job_id
+            WHERE j.run_id = ? AND r.status = 'tampered'
+        ''', (run_id,))
+        tampered = [{"filepath": f, "status": s, "message": m} for f, s, m in cursor.fetchall()]
+        conn.close()
+
+        #Finished jobs of old runs may have been moved to the yearly archives
+        for record in TieredStorage(self.db_path).archived_verifications(run_id):
+            job = record["job"]
+            counts = shards.setdefault(job["status"], {"shards": 0, "files": 0})
+            counts["shards"] += 1
+            counts["files"] += job["file_count"]
+            for status, n in json.loads(job["summary"] or "{}").items():
+                totals[status] = totals.get(status, 0) + n
+            tampered += [{"filepath": f, "status": s, "message": m}
+                         for f, s, m in record["results"] if s == "tampered"]
+
+        return {"run_id": run_id, "shards": shards, "results": totals, "tampered": tampered}
+
+
+class VerificationWorker:
+    def __init__(self, db_path = "lab_image_integrity.db", worker_id = None,
+                 lease_seconds = 300, max_attempts = 3):
+        self.db_path = db_path
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.monitor = FileIntegrityMonitor(db_path)
+
+    def claim(self, run_id):
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        now = time.time()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+
+            #Shards whose worker died too many times are given up on
+            cursor.execute('''
+                UPDATE verify_jobs SET status = 'failed', finished_date = ?
+                WHERE run_id = ? AND status = 'leased' AND lease_expires < ? AND attempts >= ?
+            ''', (datetime.now().isoformat(), run_id, now, self.max_attempts))
+
+            cursor.execute('''
+                SELECT id, shard_by, range_low, range_high FROM verify_jobs
+                WHERE run_id = ?
+                  AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                ORDER BY id LIMIT 1
+            ''', (run_id, now))
+            job = cursor.fetchone()
+
+            if job:
+                cursor.execute('''
+                    UPDATE verify_jobs
+                    SET status = 'leased', worker_id = ?, lease_expires = ?, attempts = attempts + 1
+                    WHERE id = ?
+                ''', (self.worker_id, now + self.lease_seconds, job[0]))
+            cursor.execute('COMMIT')
+            return job
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id):
+        #Returns False if the lease expired and another worker took the shard
+        conn = connect(self.db_path)
+        cursor = conn.execute('''
+            UPDATE verify_jobs SET lease_expires = ?
+            WHERE id = ? AND worker_id = ? AND status = 'leased'
+        ''', (time.time() + self.lease_seconds, job_id, self.worker_id))
+        still_held = cursor.rowcount == 1
+        conn.close()
+        return still_held
+
+    def shard_files(self, shard_by, range_low, range_high):
+        conn = connect(self.db_path)
+        if shard_by == "path":
+            cursor = conn.execute('''
+                SELECT filepath FROM file_hashes WHERE filepath >= ? AND filepath <= ? ORDER BY filepath
+            ''', (range_low, range_high))
+        elif range_high is None:
+            cursor = conn.execute('SELECT filepath FROM file_hashes WHERE original_hash >= ?', (range_low,))
+        else:
+            cursor = conn.execute('''
+                SELECT filepath FROM file_hashes WHERE original_hash >= ? AND original_hash < ?
+            ''', (range_low, range_high))
+        #Read the list up front so no read transaction stays open while verifying
+        filepaths = [row[0] for row in cursor]
+        conn.close()
+        return filepaths
+
+    def verify_shard(self, job):
+        job_id, shard_by, range_low, range_high = job
+        lost = threading.Event()
+        stop = threading.Event()
+
+        def keep_alive():
+            while not stop.wait(self.lease_seconds / 3):
+                if not self.heartbeat(job_id):
+                    lost.set()
+                    return
+
+        beat = threading.Thread(target=keep_alive, daemon=True)
+        beat.start()
+
+        summary = {}
+        problems = []
+        try:
+            for filepath, result in self.iter_verify_paths(self.shard_files(shard_by, range_low, range_high)):
+                if lost.is_set():
+                    print(f"Lease lost on shard {job_id}, abandoning it")
+                    return None
+                summary[result["status"]] = summary.get(result["status"], 0) + 1
+                if result["status"] not in ("verified", "approved_modifications"):
+                    problems.append((job_id, filepath, result["status"], result["message"]))
+        finally:
+            stop.set()
+            beat.join()
+
+        return self.report(job_id, summary, problems)
+
+    def iter_verify_paths(self, filepaths):
+        #Plain files one at a time; archive members are grouped so each archive is read once
+        by_archive = {}
+        for filepath in filepaths:
+            member = split_member_path(filepath)
+            if member:
+                by_archive.setdefault(member[0], {})[member[1]] = filepath
+            else:
+                yield filepath, self.verify_with_retry(filepath)
+
+        for archive_path, members in by_archive.items():
+            yield from self.iter_verify_members(archive_path, members)
+
+    def iter_verify_members(self, archive_path, members):
+        #members maps member name -> registered filepath
+        try:
+            hashed = list(iter_member_hashes(archive_path, names=set(members)))
+        except Exception as e:
+            for filepath in members.values():
+                yield filepath, {"status": "error", "message": f"Reading archive failed: {e}"}
+            return
+
+        for member_name, file_hash, file_size in hashed:
+            filepath = members.pop(member_name, None)
+            if filepath:
+                yield filepath, self.verify_with_retry(filepath, (file_hash, file_size))
+        for filepath in members.values():
+            yield filepath, {"status": "error", "message": "File not found"}
+
+    def verify_with_retry(self, filepath, hashed = None, retries = 3):
+        #hashed is (hash, size) when the file was already read, e.g. as part of an archive
+        for attempt in range(retries):
+            try:
+                if hashed:
+                    return self.monitor.verify_hashed(filepath, *hashed)
+                return self.monitor.verify_file(filepath)
+            except sqlite3.OperationalError as e:
+                #Many workers updating last_verified can briefly lock the database
+                if attempt == retries - 1:
+                    return {"status": "error", "message": f"Database error: {e}"}
+                time.sleep(1 + attempt)
+
+    def report(self, job_id, summary, problems):
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                UPDATE verify_jobs
+                SET status = 'done', finished_date = ?, summary = ?, lease_expires = NULL
+                WHERE id = ? AND worker_id = ? AND status = 'leased'
+            ''', (datetime.now().isoformat(), json.dumps(summary), job_id, self.worker_id))
+
+            #Only the lease holder may report; a late worker's results are dropped
+            if cursor.rowcount != 1:
+                cursor.execute('ROLLBACK')
+                return None
+
+            cursor.executemany('''
+                INSERT INTO verify_job_results (job_id, filepath, status, message)
+                VALUES (?, ?, ?, ?)
+            ''', problems)
+            cursor.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        return {"job_id": job_id, "worker_id": self.worker_id, "summary": summary}
+
+    def outstanding(self, run_id):
+        conn = connect(self.db_path)
+        count = conn.execute('''
+            SELECT COUNT(*) FROM verify_jobs WHERE run_id = ? AND status IN ('pending', 'leased')
+        ''', (run_id,)).fetchone()[0]
+        conn.close()
+        return count
+
+    #Generator API - yields each finished shard's summary
+    def iter_run(self, run_id):
+        while True:
+            job = self.claim(run_id)
+            if job:
+                result = self.verify_shard(job)
+                if result:
+                    yield result
+            elif self.outstanding(run_id):
+                #Other workers hold the remaining leases; wait in case one of them dies
+                time.sleep(max(1, self.lease_seconds / 3))
+            else:
+                return
+
+    def run(self, run_id):
+        completed = 0
+        for result in self.iter_run(run_id):
+            completed += 1
+            print(f"Shard {result['job_id']} done: {result['summary']}")
+        print(f"Worker {self.worker_id}: {completed} shard(s) verified")
+        return completed
+
+
+def _worker_process(db_path, run_id, lease_seconds):
+    #Spawned children do not inherit the parent's redirect_stdout; keep stdout for the caller's output
+    with redirect_stdout(sys.stderr):
+        VerificationWorker(db_path, lease_seconds=lease_seconds).run(run_id)
+
+
+def run_workers(db_path, run_id, processes = os.cpu_count() or 1, lease_seconds = 300):
+    #Starts local worker processes and waits for the queue to drain
+    workers = [Process(target=_worker_process, args=(db_path, run_id, lease_seconds))
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return VerificationCoordinator(db_path).run_status(run_id)